@@ -20,6 +20,8 @@ from app.processing.histogram_equalization import EqualizeHistogram
 from app.processing.image_normalization import ImageNormalization
 from app.processing.thresholding import Thresholding
 from app.processing.rgb_image_converter import RGBImageConverter
+from app.processing.parallel import ParallelExecutor
+from app.processing.threaded_execution import ThreadedExecution
 
 
 class MainWindowController:
@@ -34,6 +36,10 @@ class MainWindowController:
         self.original_image = None
         self.processed_image = self.original_image
 
+        # last fourier filter and its result, re-applied live while the radius slider moves
+        self.fourier_filter_type = None
+        self.fourier_filtered_image = None
+
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self.MainWindow)
 
@@ -46,6 +52,11 @@ class MainWindowController:
         self.threshold = Thresholding()
         self.convert = RGBImageConverter()
 
+        # neighbourhood operations run tile by tile on all cores,
+        # the per-channel loops of the other operations run on a thread pool
+        self.parallel = ParallelExecutor()
+        ThreadedExecution.enable()
+
         # variables for hybrid images
         self.low_frequency_image = None
         self.high_frequency_image = None
@@ -84,6 +95,7 @@ class MainWindowController:
 
         self.ui.hpf_button.clicked.connect(lambda: self.apply_fourier_filters("High"))
         self.ui.lpf_button.clicked.connect(lambda: self.apply_fourier_filters("Low"))
+        self.ui.raduis_control_slider.valueChanged.connect(self.update_fourier_filter)
 
         # Connect the show_metrics_button to the new method
         self.ui.show_metrics_button.clicked.connect(self.show_metrics)
@@ -93,6 +105,7 @@ class MainWindowController:
         self.ui.grayscaling_button.clicked.connect(self.gray_image_converter)
         self.ui.local_threshold_button.clicked.connect(self.local_thresholding)
         self.ui.global_threshold_button.clicked.connect(self.global_thresholding)
+        self.ui.otsu_threshold_button.clicked.connect(self.otsu_thresholding)
 
         # Connect the hybrid image upload buttons
         self.ui.upload_low_freq_button.clicked.connect(self.upload_low_frequency_image)
@@ -143,12 +156,14 @@ class MainWindowController:
 
         sigma = self.ui.gaussian_filter_sigma_spinbox.value()
 
+        kernel_size = self.ui.current_kernal_size
+
         if type == "Average":
-            self.processed_image = Denoise.apply_average_filter(self.processed_image, self.ui.current_kernal_size)
+            self.processed_image = self.parallel.apply(self.processed_image, Denoise.apply_average_filter, kernel_size=kernel_size)
         elif type == "Gaussian":
-            self.processed_image = Denoise.apply_gaussian_filter(self.processed_image, self.ui.current_kernal_size, sigma)
+            self.processed_image = self.parallel.apply(self.processed_image, Denoise.apply_gaussian_filter, kernel_size=kernel_size, sigma=sigma)
         elif type == "Median":
-            self.processed_image = Denoise.apply_median_filter(self.processed_image, self.ui.current_kernal_size)
+            self.processed_image = self.parallel.apply(self.processed_image, Denoise.apply_median_filter, kernel_size=kernel_size)
 
         self.showProcessed()
 
@@ -161,11 +176,11 @@ class MainWindowController:
             self.original_image = cv2.cvtColor(self.original_image, cv2.COLOR_RGB2GRAY)
 
         if type == "Sobel":
-            self.processed_image = EdgeDetection.apply_sobel(self.original_image)
+            self.processed_image = self.parallel.apply(self.original_image, EdgeDetection.apply_sobel)
         elif type == "Roberts":
-            self.processed_image = EdgeDetection.apply_roberts(self.original_image)
+            self.processed_image = self.parallel.apply(self.original_image, EdgeDetection.apply_roberts)
         elif type == "Prewitt":
-            self.processed_image = EdgeDetection.apply_prewitt(self.original_image)
+            self.processed_image = self.parallel.apply(self.original_image, EdgeDetection.apply_prewitt)
         elif type == "Canny":
             low = self.ui.edge_detection_low_threshold_spinbox.value()
             high = self.ui.edge_detection_high_threshold_spinbox.value()
@@ -185,8 +200,18 @@ class MainWindowController:
         elif type == "Low":
             self.processed_image = FourierFilters.apply_low_pass(self.original_image, radius)
 
+        self.fourier_filter_type = type
+        self.fourier_filtered_image = self.processed_image
         self.showProcessed()
 
+    def update_fourier_filter(self):
+        # only while the shown result still comes from a fourier filter: the spectrum of the original image
+        # is cached, so each new radius costs a mask multiply and an inverse fft
+        if self.fourier_filter_type is None or self.processed_image is not self.fourier_filtered_image:
+            return
+
+        self.apply_fourier_filters(self.fourier_filter_type)
+
     def upload_low_frequency_image(self):
         self.path_1 = self.srv.upload_image_file()
         if self.path_1:
@@ -206,15 +231,13 @@ class MainWindowController:
             print("Please upload both low-frequency and high-frequency images first.")
             return
 
-        # Generate the hybrid image
-        self.hybrid_image = self.hybrid_generator.generate_hybrid_image(
+        # Generate the hybrid image, the previews show the filtered components it was made of
+        self.hybrid_image, low_freq_filtered, high_freq_filtered = self.hybrid_generator.generate_hybrid_image(
             self.low_frequency_image, self.high_frequency_image, self.hybrid_image
         )
-        low_freq_filtered = FourierFilters.apply_low_pass(self.low_frequency_image, 20)
         self.srv.clear_image(self.ui.low_frequency_groupbox)
         self.srv.set_image_in_groupbox(self.ui.low_frequency_groupbox, low_freq_filtered)
 
-        high_freq_filtered = FourierFilters.apply_high_pass(self.high_frequency_image, 5)
         self.srv.clear_image(self.ui.high_frequency_groupbox)
         self.srv.set_image_in_groupbox(self.ui.high_frequency_groupbox, high_freq_filtered)
 
@@ -248,6 +271,7 @@ class MainWindowController:
 
         self.srv.clear_image(self.ui.processed_groupBox)
         self.srv.set_image_in_groupbox(self.ui.processed_groupBox, self.original_image)
+        self.fourier_filter_type = None
 
     def showProcessed(self):
         if self.processed_image is None:
@@ -315,6 +339,28 @@ class MainWindowController:
         # Show the processed image
         self.showProcessed()
 
+    def otsu_thresholding(self):
+        """Apply global thresholding with the threshold chosen by Otsu's method."""
+        if self.original_image is None:
+            print("No image available for thresholding.")
+            return
+
+        # Convert to grayscale if the image is in color
+        if len(self.original_image.shape) == 3:
+            gray_image = self.convert.rgb_to_gray(self.original_image)
+        else:
+            gray_image = self.original_image
+
+        threshold_value, binary_otsu = self.threshold.otsu_threshold(gray_image)
+        # show the chosen level in the global threshold spinbox, the manual threshold can start from it
+        self.ui.global_threshold_spinbox.setValue(int(threshold_value))
+
+        # Update processed image with the thresholded image
+        self.processed_image = binary_otsu
+
+        # Show the processed image
+        self.showProcessed()
+
     def local_thresholding(self):
         """Apply local thresholding to the original image."""
         if self.original_image is None:
@@ -329,7 +375,7 @@ class MainWindowController:
 
         # Apply custom local thresholding
         block_size = self.ui.local_block_size_spinbox.value()  # Size of the neighborhood
-        binary_local = self.threshold.local_threshold(gray_image, block_size, )
+        binary_local = self.parallel.apply(gray_image, Thresholding.local_threshold, block_size=block_size)
 
         # Update processed image with the equalized image
         self.processed_image = binary_local
@@ -339,5 +385,7 @@ class MainWindowController:
 
     def closeApp(self):
         """Close the application."""
+        self.parallel.shutdown()
+        ThreadedExecution.disable()
         remove_directories()
         self.app.quit()
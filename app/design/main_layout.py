@@ -544,12 +544,15 @@ class Ui_MainWindow(object):
 
         (self.global_threshold_spinbox,
          global_threshold_threshold_label,
-         global_threshold_layout) = self.util.createSpinBox(0, 100, 50)
+         global_threshold_layout) = self.util.createSpinBox(0, 255, 50)
         self.page_threshold_layout.addLayout(global_threshold_layout)
 
         self.global_threshold_button = self.util.createButton("Apply", self.button_style)
         self.page_threshold_layout.addWidget(self.global_threshold_button)
 
+        self.otsu_threshold_button = self.util.createButton("Otsu (Automatic)", self.button_style)
+        self.page_threshold_layout.addWidget(self.otsu_threshold_button)
+
         label01 = self.util.createLabel("", isHead=True)
         self.page_threshold_layout.addWidget(label01)
         label02 = self.util.createLabel("", isHead=True)
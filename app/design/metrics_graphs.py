@@ -2,6 +2,7 @@ import cv2
 import numpy as np
 from PyQt5 import QtCore, QtGui, QtWidgets
 from app.design.tools.gui_utilities import GUIUtilities
+from app.processing.histogram import Histogram
 
 
 class Ui_PopWindow:
@@ -80,7 +81,7 @@ class Ui_PopWindow:
             print("Error: Unable to load image.")
             return None, None
 
-        hist, bin_edges = np.histogram(image, bins=256, range=(0, 256))
+        hist, bin_edges = Histogram.histogram(image), Histogram.BIN_EDGES
         return hist, bin_edges
 
     def plot_graph(self, ax, x, y_hist, y_cdf, title):
@@ -131,10 +132,10 @@ class Ui_PopWindow:
         if len(image.shape) == 3:
             hist_colors = ["#FF0000", "#008000", "#0000FF"]
             cdf_colors = ["#FF7F7F", "#90EE90", "#ADD8E6"]
+            # histograms and CDFs of the three channels in one pass
+            histograms, cdfs, bins = Histogram.histogram(image), Histogram.cdf(image), Histogram.BIN_EDGES
             for i in range(3):
-                hist, bins = np.histogram(image[:, :, i].flatten(), bins=256, range=[0, 256])
-                pdf = hist / np.sum(hist)
-                cdf = np.cumsum(pdf)
+                hist, cdf = histograms[i], cdfs[i]
                 if plot == "processed":
                     self.plot_graph_RGB(self.distribution_plot_widget.ax, bins, hist, cdf * np.max(hist), hist_colors[i], cdf_colors[i], plot)
                     self.distribution_plot_widget.draw()
@@ -143,11 +144,10 @@ class Ui_PopWindow:
                     self.histogram_plot_widget.draw()
 
         else:
-            hist, bins = np.histogram(image, bins=256, range=(0, 256))
+            hist, bins = Histogram.histogram(image), Histogram.BIN_EDGES
             if hist is None:
                 return
-            pdf = hist / np.sum(hist)
-            cdf = np.cumsum(pdf) * np.max(hist)
+            cdf = Histogram.cdf(image) * np.max(hist)
             if plot == "processed":
                 self.plot_graph(self.distribution_plot_widget.ax, bins, hist, cdf, plot)
                 self.distribution_plot_widget.draw()
@@ -0,0 +1,149 @@
+import numpy as np
+from app.processing.denoise import Denoise
+from app.processing.edge_detection import EdgeDetection
+from app.processing.fourier_filers import FourierFilters
+from app.processing.histogram import Histogram
+from app.processing.thresholding import Thresholding
+
+
+class BatchProcessor:
+    """
+    Batch entry points for the processing operations.
+    Every method accepts either an N×H×W(×C) stack or a list of images; lists with mixed sizes are grouped into
+    buckets of equal shape and dtype, each bucket is stacked and processed with a single vectorized call, and the
+    results come back in the input order. Kernels, FFT masks and lookup tables are built once per bucket.
+    Results are identical to calling the single image function on every image in a loop.
+    """
+
+    @staticmethod
+    def buckets(images):
+        # indices of the images sharing the same shape and dtype, in order of first appearance
+        groups = {}
+        for index, image in enumerate(images):
+            groups.setdefault((image.shape, image.dtype.str), []).append(index)
+        return list(groups.values())
+
+    @staticmethod
+    def run(images, stack_function):
+        """Applies stack_function to every bucket of images and returns the results in the input form."""
+        if isinstance(images, np.ndarray):
+            return stack_function(images)
+
+        results = [None] * len(images)
+        for indices in BatchProcessor.buckets(images):
+            stack_result = stack_function(np.stack([images[i] for i in indices]))
+            for position, index in enumerate(indices):
+                results[index] = stack_result[position]
+        return results
+
+    @staticmethod
+    def run_spatial(images, operation, **kwargs):
+        """
+        Runs a single image operation on whole stacks: the stack axis is moved behind the spatial axes,
+        where the engines treat it like extra colour channels, and moved back afterwards.
+        """
+        def stack_function(stack):
+            result = operation(np.moveaxis(stack, 0, 2), **kwargs)
+            return np.ascontiguousarray(np.moveaxis(result, 2, 0))
+
+        return BatchProcessor.run(images, stack_function)
+
+    @staticmethod
+    def apply_average_filter(images, kernel_size=3):
+        return BatchProcessor.run_spatial(images, Denoise.apply_average_filter, kernel_size=kernel_size)
+
+    @staticmethod
+    def apply_gaussian_filter(images, kernel_size=3, sigma=1):
+        return BatchProcessor.run_spatial(images, Denoise.apply_gaussian_filter, kernel_size=kernel_size, sigma=sigma)
+
+    @staticmethod
+    def apply_median_filter(images, kernel_size=3):
+        return BatchProcessor.run_spatial(images, Denoise.apply_median_filter, kernel_size=kernel_size)
+
+    @staticmethod
+    def apply_sobel(images):
+        return BatchProcessor.run_spatial(images, EdgeDetection.apply_sobel)
+
+    @staticmethod
+    def apply_roberts(images):
+        return BatchProcessor.run_spatial(images, EdgeDetection.apply_roberts)
+
+    @staticmethod
+    def apply_prewitt(images):
+        return BatchProcessor.run_spatial(images, EdgeDetection.apply_prewitt)
+
+    @staticmethod
+    def apply_canny(images, threshold1=100, threshold2=200, apertureSize=3, L2gradient=False):
+        # hysteresis labels the connected components of every image on its own, the batch only saves the bucketing
+        def stack_function(stack):
+            return np.stack([EdgeDetection.apply_canny(image, threshold1, threshold2, apertureSize, L2gradient) for image in stack])
+
+        return BatchProcessor.run(images, stack_function)
+
+    @staticmethod
+    def apply_low_pass(images, radius=30):
+        # one mask for the whole bucket, every image and channel is filtered against it.
+        # the spectrum of a whole stack is used once, it is not kept in the spectrum cache
+        return BatchProcessor.run_spatial(images, FourierFilters.apply_low_pass, radius=radius, cache=False)
+
+    @staticmethod
+    def apply_high_pass(images, radius=30):
+        return BatchProcessor.run_spatial(images, FourierFilters.apply_high_pass, radius=radius, cache=False)
+
+    @staticmethod
+    def equalize(images):
+        """Histogram equalization of every image (grayscale N×H×W or per channel N×H×W×C) from one bincount per bucket."""
+        def stack_function(stack):
+            count = stack.shape[0]
+            channels = stack.reshape(count, -1, 1 if stack.ndim == 3 else stack.shape[3])
+            channel_count = channels.shape[2]
+
+            # every (image, channel) pair is a channel of one H·W×N×C array counted by the histogram engine,
+            # a batch is rarely seen twice so the histograms are not cached
+            cdf = Histogram.cdf(np.moveaxis(channels, 0, 1)[:, None], cache=False)
+
+            # the same steps as EqualizeHistogram, on all the histograms at once
+            new_pixel_values = np.round(cdf * 255).astype(np.uint8)
+
+            # map the old pixel values to the new ones through each image's own table
+            image_index = np.arange(count)[:, None, None]
+            channel_index = np.arange(channel_count)[None, None, :]
+            return new_pixel_values[image_index, channel_index, channels].reshape(stack.shape)
+
+        return BatchProcessor.run(images, stack_function)
+
+    @staticmethod
+    def normalize(images):
+        """Min-max normalization of every image (grayscale, or per channel) with the minima and maxima of the whole bucket at once."""
+        def stack_function(stack):
+            axes = (1, 2)
+            min_val = np.min(stack, axis=axes, keepdims=True)
+            max_val = np.max(stack, axis=axes, keepdims=True)
+
+            # images (or channels) without any contrast stay zero, like in ImageNormalization
+            with np.errstate(divide='ignore', invalid='ignore'):
+                normalized = ((stack - min_val) / (max_val - min_val)) * 255
+            return np.where(max_val > min_val, normalized, 0).astype(np.uint8)
+
+        return BatchProcessor.run(images, stack_function)
+
+    @staticmethod
+    def global_threshold(images, threshold_value):
+        # a point operation: the stack is thresholded as one array
+        return BatchProcessor.run(images, lambda stack: Thresholding.global_threshold(stack, threshold_value))
+
+    @staticmethod
+    def local_threshold(images, block_size, method='mean', k=None, r=128):
+        # block statistics come from integral images over the spatial axes, the whole stack is one call
+        return BatchProcessor.run_spatial(images, Thresholding.local_threshold, block_size=block_size, method=method, k=k, r=r)
+
+    @staticmethod
+    def rgb_to_gray(images):
+        def stack_function(stack):
+            if stack.ndim != 4 or stack.shape[3] != 3:
+                raise ValueError("Input images must be color (RGB) images.")
+            # the luminosity method of RGBImageConverter on every image at once
+            gray_images = 0.2126 * stack[..., 0] + 0.7152 * stack[..., 1] + 0.0722 * stack[..., 2]
+            return gray_images.astype(np.uint8)
+
+        return BatchProcessor.run(images, stack_function)
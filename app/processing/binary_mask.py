@@ -0,0 +1,114 @@
+import numpy as np
+
+
+class BinaryMask:
+    """
+    Bit-packed binary image: eight pixels per byte along the rows (np.packbits over axis 1, most significant bit
+    first), an eighth of the memory of the 0/255 uint8 images thresholding and edge detection produce.
+    Logical operations and pixel counts work on the packed bytes directly, unpack() restores the uint8 image.
+    The unused bits at the end of every row are kept at zero, so counts never see them.
+    """
+
+    # number of set bits of every byte value, for numpy versions without np.bitwise_count
+    POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+    def __init__(self, bits, shape):
+        self.bits = bits
+        self.shape = tuple(shape)
+
+    @classmethod
+    def from_bool(cls, mask):
+        mask = np.asarray(mask, dtype=bool)
+        return cls(np.packbits(mask, axis=1), mask.shape)
+
+    @classmethod
+    def from_image(cls, image):
+        # every non zero pixel is set
+        return cls.from_bool(np.asarray(image) != 0)
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+    def to_bool(self):
+        return np.unpackbits(self.bits, axis=1, count=self.shape[1]).view(bool)
+
+    def unpack(self, value=255):
+        """The uint8 image: value where the mask is set, 0 elsewhere."""
+        return np.unpackbits(self.bits, axis=1, count=self.shape[1]) * np.uint8(value)
+
+    def count(self):
+        # popcount of the packed bytes
+        if hasattr(np, 'bitwise_count'):
+            return int(np.bitwise_count(self.bits).sum(dtype=np.int64))
+        return int(BinaryMask.POPCOUNT[self.bits].sum(dtype=np.int64))
+
+    def __and__(self, other):
+        return BinaryMask(self.bits & self.__matching(other).bits, self.shape)
+
+    def __or__(self, other):
+        return BinaryMask(self.bits | self.__matching(other).bits, self.shape)
+
+    def __xor__(self, other):
+        return BinaryMask(self.bits ^ self.__matching(other).bits, self.shape)
+
+    def __invert__(self):
+        bits = ~self.bits
+        # clear the padding bits of the last byte of every row again
+        tail = self.shape[1] % 8
+        if tail:
+            bits[:, -1] &= np.uint8((0xFF << (8 - tail)) & 0xFF)
+        return BinaryMask(bits, self.shape)
+
+    def __matching(self, other):
+        if self.shape != other.shape:
+            raise ValueError(f"Mask shapes differ: {self.shape} and {other.shape}.")
+        return other
+
+    def save_npz(self, path):
+        # the packed bytes together with the unpacked shape, the padding of the last byte of every row is not a pixel
+        np.savez(path, bits=self.bits, shape=np.asarray(self.shape, dtype=np.int64))
+
+    @classmethod
+    def load_npz(cls, path):
+        with np.load(path) as data:
+            return cls(data['bits'], tuple(int(size) for size in data['shape']))
+
+    def save_pbm(self, path):
+        """Writes a binary PBM (P4) image. PBM stores black as 1, set pixels (255 in the image) are written white."""
+        if len(self.shape) != 2:
+            raise ValueError("Only 2D masks can be saved as PBM.")
+
+        height, width = self.shape
+        with open(path, 'wb') as file:
+            file.write(f"P4\n{width} {height}\n".encode('ascii'))
+            # PBM rows are padded to whole bytes as well, the packed rows are written as they are
+            file.write((~self).bits.tobytes())
+
+    @classmethod
+    def load_pbm(cls, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        # header: magic number, width and height separated by whitespace, comments start with '#'
+        fields = []
+        position = 0
+        while len(fields) < 3:
+            while data[position:position + 1].isspace():
+                position += 1
+            if data[position:position + 1] == b'#':
+                position = data.index(b'\n', position) + 1
+                continue
+            end = position
+            while not data[end:end + 1].isspace():
+                end += 1
+            fields.append(data[position:end])
+            position = end
+        if fields[0] != b'P4':
+            raise ValueError("Not a binary PBM (P4) file.")
+
+        # a single whitespace character separates the header from the pixels
+        width, height = int(fields[1]), int(fields[2])
+        row_bytes = -(-width // 8)
+        bits = np.frombuffer(data, dtype=np.uint8, count=height * row_bytes, offset=position + 1).reshape(height, row_bytes)
+        return ~cls(bits.copy(), (height, width))
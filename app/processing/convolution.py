@@ -0,0 +1,141 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from app.processing.fft_backend import FFTBackend
+
+
+class Convolution:
+    """
+    Shared neighbourhood engine used by the denoise and edge detection filters.
+    The first two axes of every image are the spatial axes, any trailing axes (colour channels) are processed together.
+    """
+
+    @staticmethod
+    def pad(image, kernel_shape, mode='reflect', anchor=None):
+        # determine the kernel height and width and the position of its origin (center by default)
+        kernel_height, kernel_width = kernel_shape
+        anchor_y, anchor_x = anchor if anchor is not None else (kernel_height // 2, kernel_width // 2)
+
+        # pad only the spatial axes so that every output pixel has a full neighbourhood
+        pad_width = [(anchor_y, kernel_height - 1 - anchor_y), (anchor_x, kernel_width - 1 - anchor_x)]
+        pad_width += [(0, 0)] * (image.ndim - 2)
+
+        if mode == 'constant':
+            return np.pad(image, pad_width, mode='constant', constant_values=0)
+        return np.pad(image, pad_width, mode=mode)
+
+    @staticmethod
+    def window_view(image, kernel_shape, mode='reflect', anchor=None):
+        """Returns a strided (copy free) view of shape H×W(×C)×kh×kw holding the neighbourhood of every pixel."""
+        padded_image = Convolution.pad(image, kernel_shape, mode, anchor)
+        return sliding_window_view(padded_image, kernel_shape, axis=(0, 1))
+
+    @staticmethod
+    def convolve(image, kernel, mode='reflect', anchor=None, output_dtype=np.float32):
+        """
+        Convolves the image with the kernel in one pass over the kernel taps.
+        Each tap multiplies a shifted view of the padded image and accumulates it into the output,
+        so the work done in python grows with the kernel size and not with the image size.
+        """
+        kernel = np.asarray(kernel)
+        kernel_height, kernel_width = kernel.shape
+        height, width = image.shape[:2]
+
+        flipped_kernel = np.flipud(np.fliplr(kernel))  # Flip both vertically and horizontally
+        padded_image = Convolution.pad(image, kernel.shape, mode, anchor)
+
+        # the products have the type a per pixel region * kernel would have
+        product_dtype = np.result_type(image.dtype, kernel.dtype)
+
+        output = None
+        for i in range(kernel_height):
+            for j in range(kernel_width):
+                weight = flipped_kernel[i, j]
+                # taps of value zero contribute nothing (the center column of sobel and prewitt)
+                if weight == 0:
+                    continue
+                # multiply the shifted view of the padded image aligned with this kernel tap by its weight
+                region = padded_image[i:i + height, j:j + width]
+                output = Convolution._add(output, np.multiply(region, weight, dtype=product_dtype))
+
+        if output is None:
+            return np.zeros(image.shape, dtype=output_dtype)
+        return output.astype(output_dtype, copy=False)
+
+    @staticmethod
+    def convolve_separable(image, terms, mode='reflect', anchor=None, output_dtype=np.float32):
+        """
+        Convolves the image with the kernel sum(outer(column, row) for column, row in terms).
+        Every term is a column pass followed by a row pass over the padded image, so a kernel_size×kernel_size
+        rank-1 kernel costs 2·kernel_size taps per pixel instead of kernel_size².
+        """
+        height, width = image.shape[:2]
+        kernel_shape = (len(terms[0][0]), len(terms[0][1]))
+        padded_image = Convolution.pad(image, kernel_shape, mode, anchor)
+
+        output = None
+        for column, row in terms:
+            column, row = np.asarray(column), np.asarray(row)
+            # integer factors stay exact, floating factors are accumulated in double precision
+            dtype = np.result_type(image.dtype, column.dtype, row.dtype)
+            if np.issubdtype(dtype, np.floating):
+                dtype = np.float64
+
+            # flip both factors for a convolution, then run the column (vertical) and the row (horizontal) pass
+            vertical = Convolution.__correlate_axis(padded_image, column[::-1], 0, height, dtype)
+            term = Convolution.__correlate_axis(vertical, row[::-1], 1, width, dtype)
+            output = Convolution._add(output, term)
+
+        if output is None:
+            return np.zeros(image.shape, dtype=output_dtype)
+        return output.astype(output_dtype, copy=False)
+
+    @staticmethod
+    def convolve_fft(image, kernel, mode='reflect', anchor=None, output_dtype=np.float32):
+        """
+        Convolves the image with the kernel as a product of spectra.
+        The padded image already holds every neighbourhood, so a circular convolution of the padded size
+        only wraps into rows and columns that are cropped away afterwards. The transforms are zero padded further
+        to the next 5-smooth size, which only moves the wrap around further out.
+        """
+        kernel = np.asarray(kernel)
+        kernel_height, kernel_width = kernel.shape
+        height, width = image.shape[:2]
+        padded_image = Convolution.pad(image, kernel.shape, mode, anchor)
+        fast_shape = FFTBackend.fast_shape(padded_image.shape[:2])
+
+        # real input: half spectra over the two spatial axes, the kernel spectrum broadcasts over the channels
+        image_spectrum = FFTBackend.rfft2(padded_image, s=fast_shape, axes=(0, 1))
+        kernel_spectrum = FFTBackend.rfft2(kernel, s=fast_shape)
+        kernel_spectrum = kernel_spectrum.reshape(kernel_spectrum.shape + (1,) * (image.ndim - 2))
+        output = FFTBackend.irfft2(image_spectrum * kernel_spectrum, s=fast_shape, axes=(0, 1))
+        output = output[kernel_height - 1:kernel_height - 1 + height, kernel_width - 1:kernel_width - 1 + width]
+
+        # integer images convolved with integer kernels have integer results, remove the round-off
+        if np.issubdtype(image.dtype, np.integer) and np.issubdtype(kernel.dtype, np.integer):
+            output = np.rint(output)
+        return output.astype(output_dtype)
+
+    def __correlate_axis(array, weights, axis, length, dtype):
+        # one dimensional shifted accumulation of the taps along a single axis, keeping `length` outputs
+        output = None
+        for t, weight in enumerate(weights):
+            if weight == 0:
+                continue
+            index = [slice(None)] * array.ndim
+            index[axis] = slice(t, t + length)
+            output = Convolution._add(output, np.multiply(array[tuple(index)], weight, dtype=dtype))
+
+        if output is None:
+            shape = list(array.shape)
+            shape[axis] = length
+            return np.zeros(shape, dtype=dtype)
+        return output
+
+    @staticmethod
+    def _add(total, term):
+        # in place sum where None stands for an all zero term
+        if total is None:
+            return term
+        if term is not None:
+            total += term
+        return total
@@ -0,0 +1,152 @@
+import json
+import math
+import time
+
+import numpy as np
+from app.processing.convolution import Convolution
+from app.processing.fft_backend import FFTBackend
+from app.processing.integral_image import IntegralImage
+from app.processing.kernel_decomposition import KernelDecomposition
+
+
+class ConvolutionPlanner:
+    """
+    Picks the cheapest convolution backend for every call from a small cost model:
+
+        direct      taps · pixels                   dense shifted accumulation
+        separable   rank · (kh + kw) · pixels       row and column passes of a low rank kernel
+        integral    pixels                          uniform (box) kernels, four lookups per pixel
+        fft         fast pixels · log2(fast)        product of spectra (padded to 5-smooth sizes)
+
+    Each cost is scaled by a per backend coefficient (seconds per unit of work and channel).
+    The defaults were measured on a desktop CPU, calibrate() replaces them with numbers measured on this host.
+    Decisions are cached per (image shape, dtype, kernel shape, rank, uniform kernel).
+    """
+
+    BACKENDS = ('direct', 'separable', 'integral', 'fft')
+
+    coefficients = {
+        'direct': 1.5e-9,
+        'separable': 1.5e-9,
+        'integral': 1.1e-8,
+        'fft': 3.0e-9,
+    }
+
+    # fixed cost of a call (padding, temporaries), in seconds per channel
+    overheads = {
+        'direct': 0.0,
+        'separable': 0.0,
+        'integral': 2.0e-5,
+        'fft': 1.0e-4,
+    }
+
+    MAX_RANK = 2
+    _decisions = {}
+
+    @classmethod
+    def convolve(cls, image, kernel, mode='reflect', anchor=None, output_dtype=np.float32, terms=None):
+        """
+        Convolves the image with the kernel on the backend the cost model predicts to be the fastest.
+        Callers that already know a separable form of the kernel can pass it as terms to skip the decomposition.
+        """
+        kernel = np.asarray(kernel)
+        if terms is None:
+            terms = KernelDecomposition.decompose(kernel, cls.MAX_RANK)
+
+        uniform = bool(np.all(kernel == kernel.flat[0]))
+        backend = cls.plan(image.shape, image.dtype, kernel.shape, len(terms) if terms is not None else None, uniform)
+
+        if backend == 'separable':
+            return Convolution.convolve_separable(image, terms, mode, anchor, output_dtype)
+        if backend == 'integral':
+            window_sums = IntegralImage.padded(image, kernel.shape, mode, anchor).window_sum(kernel.shape)
+            return (window_sums * kernel.flat[0]).astype(output_dtype)
+        if backend == 'fft':
+            return Convolution.convolve_fft(image, kernel, mode, anchor, output_dtype)
+        return Convolution.convolve(image, kernel, mode, anchor, output_dtype)
+
+    @classmethod
+    def plan(cls, image_shape, dtype, kernel_shape, rank=None, uniform=False):
+        """Returns the name of the cheapest backend, a rank of None means the kernel has no low rank form."""
+        key = (tuple(image_shape), np.dtype(dtype).str, tuple(kernel_shape), rank, uniform)
+        if key not in cls._decisions:
+            costs = cls.estimate(image_shape, kernel_shape, rank, uniform)
+            cls._decisions[key] = min(costs, key=costs.get)
+        return cls._decisions[key]
+
+    @classmethod
+    def estimate(cls, image_shape, kernel_shape, rank=None, uniform=False):
+        """Predicted run time in seconds of every backend that can handle this kernel."""
+        channels = int(np.prod(image_shape[2:], dtype=np.int64))
+        work = ConvolutionPlanner.__work(image_shape, kernel_shape, rank, uniform)
+
+        return {backend: channels * (cls.overheads[backend] + cls.coefficients[backend] * units)
+                for backend, units in work.items()}
+
+    @classmethod
+    def clear_cache(cls):
+        cls._decisions.clear()
+
+    @classmethod
+    def calibrate(cls, image_size=512, kernel_sizes=(3, 7, 15, 31), repeats=3, path=None):
+        """
+        Times every backend on this host and replaces the cost coefficients with the measured ones.
+        The coefficients (and so the crossover points) are returned and optionally written to a json file.
+        """
+        rng = np.random.default_rng(0)
+        image = rng.integers(0, 256, (image_size, image_size), dtype=np.uint8)
+
+        samples = {backend: [] for backend in cls.BACKENDS}
+        for kernel_size in kernel_sizes:
+            kernel = np.ones((kernel_size, kernel_size), dtype=np.float64) / kernel_size ** 2
+            terms = KernelDecomposition.decompose(kernel, cls.MAX_RANK)
+            runs = {
+                'direct': lambda: Convolution.convolve(image, kernel),
+                'separable': lambda: Convolution.convolve_separable(image, terms),
+                'integral': lambda: IntegralImage.padded(image, kernel.shape).window_sum(kernel.shape),
+                'fft': lambda: Convolution.convolve_fft(image, kernel),
+            }
+            work = cls.__work(image.shape, kernel.shape, len(terms), True)
+
+            for backend, run in runs.items():
+                # best of a few runs, minus the fixed overhead, per unit of work
+                elapsed = min(cls.__time(run) for _ in range(repeats))
+                samples[backend].append(max(elapsed - cls.overheads[backend], 0.0) / work[backend])
+
+        cls.coefficients = {backend: float(np.median(values)) for backend, values in samples.items()}
+        cls.clear_cache()
+
+        if path is not None:
+            with open(path, 'w') as file:
+                json.dump(cls.coefficients, file, indent=4)
+        return cls.coefficients
+
+    @classmethod
+    def load_calibration(cls, path):
+        # reuse coefficients written by an earlier calibrate(path=...)
+        with open(path) as file:
+            cls.coefficients = {**cls.coefficients, **json.load(file)}
+        cls.clear_cache()
+        return cls.coefficients
+
+    def __work(image_shape, kernel_shape, rank, uniform):
+        # units of work of every backend able to run this kernel, for a single channel
+        height, width = image_shape[:2]
+        kernel_height, kernel_width = kernel_shape
+        pixels = height * width
+        padded_pixels = (height + kernel_height - 1) * (width + kernel_width - 1)
+        fast_height, fast_width = FFTBackend.fast_shape((height + kernel_height - 1, width + kernel_width - 1))
+        fast_pixels = fast_height * fast_width
+
+        work = {'direct': kernel_height * kernel_width * pixels,
+                'fft': fast_pixels * math.log2(max(fast_pixels, 2))}
+        if rank is not None and rank > 0:
+            work['separable'] = rank * (kernel_height + kernel_width) * pixels
+        if uniform:
+            work['integral'] = padded_pixels
+        return work
+
+    def __time(run):
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
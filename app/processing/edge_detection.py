@@ -1,48 +1,130 @@
+import time
+
 import cv2
 import numpy as np
+from app.processing.binary_mask import BinaryMask
+from app.processing.convolution import Convolution
+from app.processing.convolution_planner import ConvolutionPlanner
+from app.processing.denoise import Denoise
+from app.processing.image_cache import ImageCache
 
 
 class EdgeDetection:
-    def __convolve(image, kernel, roberts=False):
-        # determine kernel height and width based on the kernel passed to the function
-        kernel_height, kernel_width = kernel.shape
+    # smoothing weights of the separable 3×3 gradient operators, the differencing weights are always [1, 0, -1]
+    SMOOTHING = {
+        'sobel': np.array([1, 2, 1], dtype=np.int16),
+        'prewitt': np.array([1, 1, 1], dtype=np.int16),
+    }
 
-        flipped_kernel = np.flipud(np.fliplr(kernel))  # Flip both vertically and horizontally
+    # tan(22.5°) in the fixed point format opencv uses to split gradient directions into sectors
+    CANNY_SHIFT = 15
+    TG22 = int(0.4142135623730950488016887242097 * (1 << CANNY_SHIFT) + 0.5)
 
-        # determine size of image padding. if type is Roberts padding size is always 1
-        if roberts == False:
-            pad_h, pad_w = kernel_height // 2, kernel_width // 2
-        if roberts == True:
-            pad_h, pad_w = 1, 1
+    # the gradients of the last few images, so canny or a threshold step can reuse them
+    gradient_cache = ImageCache(max_entries=4)
 
-        # add constant zero padding around the image
-        padded_image = np.pad(image, ((pad_h, pad_h), (pad_w, pad_w)), mode='constant', constant_values=0)
-        # initialize the output image of an array of zeroes with the same shape as image
-        output = np.zeros_like(image, dtype=np.float32)
+    # paddings whose one pixel border only depends on the two outermost rows and columns of the image:
+    # their gradients are the cached zero padded ones with the border recomputed
+    BORDER_MODES = ('edge', 'reflect', 'symmetric')
 
-        # loop over the rows and columns of the image
-        for i in range(image.shape[0]):
-            for j in range(image.shape[1]):
-                # extract a region of the size of the kernel
-                region = padded_image[i:i + kernel_height, j:j + kernel_width]
-                # return a pixel value that the summation of the mernel values multiplied by the region values
-                output[i, j] = np.sum(region * flipped_kernel)
+    def __convolve(image, kernel, roberts=False):
+        # determine size of image padding. if type is Roberts padding is always 1 before the kernel origin
+        anchor = (1, 1) if roberts else None
 
-        # return the convolved output
-        return output
+        # convolve with constant zero padding around the image and return the float32 output,
+        # the planner runs it on the cheapest backend (rank-1 sobel and prewitt kernels as row and column passes)
+        return ConvolutionPlanner.convolve(image, kernel, mode='constant', anchor=anchor)
 
     @staticmethod
-    def apply_sobel(image):
-        # create sobel type kernels for horizontal and vertical edge detection
-        sobel_x = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]])
-        sobel_y = np.array([[-1, -2, -1], [0, 0, 0], [1, 2, 1]])
+    def gradient(image, operator='sobel', mode='constant'):
+        """
+        Returns the horizontal and vertical gradients (gx, gy) of a sobel or prewitt operator, exact for integer images
+        (int16 for 8-bit input, int32 for 16-bit, int64 for wider ones) and in floating point for float images.
+        Both come from the same padded image (zero padding by default): a vertical smoothing pass feeds the horizontal
+        difference (gx) and a vertical difference feeds the horizontal smoothing pass (gy).
+        Zero padded results are cached per image version and read only. The edge, reflect and symmetric paddings
+        (canny uses edge) only change the outermost pixels: they reuse the cached interior and recompute the border.
+        """
+        if operator not in EdgeDetection.SMOOTHING:
+            raise ValueError(f"Unknown gradient operator: {operator}")
+
+        if mode in EdgeDetection.BORDER_MODES:
+            return EdgeDetection.__border_gradient(image, operator, mode)
+
+        def compute():
+            gradients = EdgeDetection.__separable_gradient(image, EdgeDetection.SMOOTHING[operator], mode)
+            # the cached arrays are shared between callers, keep them read only
+            for gradient in gradients:
+                gradient.setflags(write=False)
+            return gradients
+
+        return EdgeDetection.gradient_cache.get(image, (operator, mode), compute)
+
+    def __border_gradient(image, operator, mode):
+        # the interior of the zero padded gradient is the same for any padding
+        grad_x, grad_y = (gradient.copy() for gradient in EdgeDetection.gradient(image, operator))
+        smoothing = EdgeDetection.SMOOTHING[operator]
+
+        # first and last row and column again, each from the two rows or columns next to it with the requested padding
+        for index, strip in ((np.s_[:1], np.s_[:2]), (np.s_[-1:], np.s_[-2:])):
+            strip_x, strip_y = EdgeDetection.__separable_gradient(image[strip], smoothing, mode)
+            grad_x[index], grad_y[index] = strip_x[index], strip_y[index]
+            strip_x, strip_y = EdgeDetection.__separable_gradient(image[:, strip], smoothing, mode)
+            grad_x[:, index], grad_y[:, index] = strip_x[:, index], strip_y[:, index]
+
+        return grad_x, grad_y
+
+    def __separable_gradient(image, smoothing, mode):
+        height, width = image.shape[:2]
+        padded_image = Convolution.pad(image, (3, 3), mode=mode).astype(EdgeDetection.__gradient_dtype(image.dtype))
+
+        # the three padded rows above, at and below every output row
+        top, middle, bottom = padded_image[0:height], padded_image[1:height + 1], padded_image[2:height + 2]
+
+        # gx: vertical smoothing, then the difference of the columns left and right of every pixel
+        smoothed = top * smoothing[0] + middle * smoothing[1] + bottom * smoothing[2]
+        grad_x = smoothed[:, 0:width] - smoothed[:, 2:width + 2]
+
+        # gy: difference of the rows above and below, then horizontal smoothing
+        difference = top - bottom
+        grad_y = (difference[:, 0:width] * smoothing[0] + difference[:, 1:width + 1] * smoothing[1]
+                  + difference[:, 2:width + 2] * smoothing[2])
+
+        return grad_x, grad_y
+
+    def __gradient_dtype(dtype):
+        # the 3×3 operators reach 4 times the input range in each direction: int16 holds it for 8-bit images only
+        if dtype.kind in 'iu':
+            if dtype.itemsize == 1:
+                return np.int16
+            return np.int32 if dtype.itemsize == 2 else np.int64
+        # float images keep their precision (at least float32) instead of being truncated
+        return np.result_type(dtype, np.float32)
 
-        # get the gradient (convolution) of each kernel over the image
-        grad_x = EdgeDetection.__convolve(image, sobel_x)
-        grad_y = EdgeDetection.__convolve(image, sobel_y)
+    @staticmethod
+    def gradient_magnitude(image, operator='sobel', out=None, orientation=False):
+        """
+        Gradient magnitude of a sobel or prewitt operator written straight into a uint8 output (preallocated
+        when out is given), saturated at 255. With orientation=True the gradient direction in radians
+        (arctan2(gy, gx), float32) is returned as well.
+        """
+        grad_x, grad_y = EdgeDetection.gradient(image, operator)
+
+        # one float32 buffer: hypot, clip to 255, then cast into the output
+        magnitude = np.hypot(grad_x, grad_y, dtype=np.float32)
+        np.minimum(magnitude, 255, out=magnitude)
+        if out is None:
+            out = np.empty(magnitude.shape, dtype=np.uint8)
+        np.copyto(out, magnitude, casting='unsafe')
+
+        if orientation:
+            return out, np.arctan2(grad_y, grad_x, dtype=np.float32)
+        return out
 
-        # compute the magnitude of the gradients and cast to type uint8 to avoid overflow 
-        return np.sqrt(grad_x ** 2 + grad_y ** 2).astype(np.uint8)
+    @staticmethod
+    def apply_sobel(image):
+        # fused sobel gradient: shared separable passes, magnitude saturated to [0-255]
+        return EdgeDetection.gradient_magnitude(image, 'sobel')
 
     @staticmethod
     def apply_roberts(image):
@@ -59,18 +141,107 @@ class EdgeDetection:
 
     @staticmethod
     def apply_prewitt(image):
-        # create perwitt type kernels for horizontal and vertical edge detection
-        prewitt_x = np.array([[-1, 0, 1], [-1, 0, 1], [-1, 0, 1]])
-        prewitt_y = np.array([[-1, -1, -1], [0, 0, 0], [1, 1, 1]])
-
-        # get the gradient (convolution) of each kernel over the image
-        grad_x = EdgeDetection.__convolve(image, prewitt_x)
-        grad_y = EdgeDetection.__convolve(image, prewitt_y)
+        # fused prewitt gradient: shared separable passes, magnitude saturated to [0-255]
+        return EdgeDetection.gradient_magnitude(image, 'prewitt')
 
-        # compute the magnitude of the gradients and cast to type uint8 to avoid overflow 
-        return np.sqrt(grad_x ** 2 + grad_y ** 2).astype(np.uint8)
+    @staticmethod
+    def apply_canny(image, threshold1=100, threshold2=200, apertureSize=3, L2gradient=False, sigma=0, packed=False):
+        """
+        Native canny edge detector: optional gaussian smoothing (sigma > 0), sobel gradient, non-maximum suppression
+        with array masks per orientation sector, and hysteresis with connected-component labelling.
+        Without smoothing it follows cv2.Canny (replicated border, L1 or L2 magnitude, integer thresholds, the strongest
+        channel of colour images).
+        With packed the edges are returned as a bit-packed BinaryMask instead of the 0/255 image.
+        """
+        if apertureSize != 3:
+            raise ValueError("Only the 3×3 sobel aperture is supported.")
+
+        # opencv accepts the thresholds in any order
+        low, high = sorted((threshold1, threshold2))
+
+        if sigma > 0:
+            kernel_size = 2 * int(np.ceil(3 * sigma)) + 1
+            image = Denoise.apply_gaussian_filter(image, kernel_size, sigma)
+
+        grad_x, grad_y = EdgeDetection.gradient(image, 'sobel', mode='edge')
+        grad_x, grad_y = grad_x.astype(np.int64), grad_y.astype(np.int64)
+
+        # L2 compares squared magnitudes against squared thresholds, which keeps everything in integers
+        if L2gradient:
+            magnitude = grad_x * grad_x + grad_y * grad_y
+            low, high = min(low, 32767.0) ** 2, min(high, 32767.0) ** 2
+        else:
+            magnitude = np.abs(grad_x) + np.abs(grad_y)
+        low, high = int(np.floor(low)), int(np.floor(high))
+
+        # colour images: like opencv, every pixel keeps the gradient of the channel with the largest magnitude
+        if magnitude.ndim > 2:
+            shape = magnitude.shape[:2] + (-1,)
+            channel = np.argmax(magnitude.reshape(shape), axis=2)[..., None]
+            magnitude, grad_x, grad_y = (np.take_along_axis(array.reshape(shape), channel, axis=2)[..., 0]
+                                         for array in (magnitude, grad_x, grad_y))
+
+        candidates = EdgeDetection.__non_maximum_suppression(magnitude, grad_x, grad_y) & (magnitude > low)
+        edges = EdgeDetection.__hysteresis(candidates, candidates & (magnitude > high))
+        if packed:
+            return BinaryMask.from_bool(edges)
+        return edges.astype(np.uint8) * 255
+
+    def __non_maximum_suppression(magnitude, grad_x, grad_y):
+        # keep the pixels that are a maximum along their gradient direction
+        padded = np.pad(magnitude, 1, mode='constant')
+        up, down = padded[:-2, 1:-1], padded[2:, 1:-1]
+        left, right = padded[1:-1, :-2], padded[1:-1, 2:]
+        up_left, up_right = padded[:-2, :-2], padded[:-2, 2:]
+        down_left, down_right = padded[2:, :-2], padded[2:, 2:]
+
+        # split the directions into horizontal, vertical and the two diagonal sectors (fixed point tangents)
+        xs = np.abs(grad_x)
+        ys = np.abs(grad_y) << EdgeDetection.CANNY_SHIFT
+        tg22x = xs * EdgeDetection.TG22
+        tg67x = tg22x + (xs << (EdgeDetection.CANNY_SHIFT + 1))
+        horizontal = ys < tg22x
+        vertical = ~horizontal & (ys > tg67x)
+        diagonal = ~horizontal & ~vertical
+        same_sign = (grad_x ^ grad_y) >= 0
+
+        # ties are broken towards one side so that a flat ridge keeps exactly one pixel
+        keep = horizontal & (magnitude > left) & (magnitude >= right)
+        keep |= vertical & (magnitude > up) & (magnitude >= down)
+        keep |= diagonal & same_sign & (magnitude > up_left) & (magnitude > down_right)
+        keep |= diagonal & ~same_sign & (magnitude > up_right) & (magnitude > down_left)
+        return keep
+
+    def __hysteresis(candidates, strong):
+        # label the 8-connected groups of candidate pixels and keep every group that holds a strong pixel
+        count, labels = cv2.connectedComponents(candidates.astype(np.uint8), connectivity=8)
+        keep_label = np.zeros(count, dtype=bool)
+        keep_label[labels[strong]] = True
+        keep_label[0] = False
+        return keep_label[labels]
 
     @staticmethod
-    def apply_canny(image, threshold1=100, threshold2=200, apertureSize=3, L2gradient=False):
-        # use the built in cv2 function to compute the canny edge detection where aperture size is the kernel size set to 3
-        return cv2.Canny(image, threshold1, threshold2, apertureSize=apertureSize, L2gradient=L2gradient)
+    def compare_canny_with_opencv(image, threshold1=100, threshold2=200, L2gradient=False, repeats=3, tolerance=0.001):
+        """
+        Benchmarks the native canny against cv2.Canny on the same input.
+        Returns the best run times, the fraction of pixels that differ and whether it is within the tolerance.
+        """
+        def best_time(run):
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                result = run()
+                times.append(time.perf_counter() - start)
+            return min(times), result
+
+        def native_run():
+            # without clearing, the gradient cache would turn every native run after the first into a hit
+            EdgeDetection.gradient_cache.clear()
+            return EdgeDetection.apply_canny(image, threshold1, threshold2, L2gradient=L2gradient)
+
+        native_time, native = best_time(native_run)
+        opencv_time, opencv = best_time(lambda: cv2.Canny(image, threshold1, threshold2, apertureSize=3, L2gradient=L2gradient))
+
+        mismatch = float(np.count_nonzero(native != opencv)) / native.size
+        return {'native_seconds': native_time, 'opencv_seconds': opencv_time,
+                'mismatch': mismatch, 'matches': mismatch <= tolerance}
@@ -0,0 +1,84 @@
+import functools
+
+import numpy as np
+from app.processing.threaded_execution import ThreadedExecution
+
+# optional faster FFT libraries, numpy.fft is always there as the fallback
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+try:
+    import pyfftw
+    import pyfftw.interfaces.numpy_fft as pyfftw_fft
+    # keep the plans of the last transforms alive, repeated shapes (every channel, every slider move) reuse them
+    pyfftw.interfaces.cache.enable()
+    pyfftw.interfaces.cache.set_keepalive_time(30)
+except ImportError:
+    pyfftw = None
+    pyfftw_fft = None
+
+
+class FFTBackend:
+    """
+    Real 2D FFTs on the fastest library installed: scipy.fft (multithreaded through workers=N), pyFFTW (threads and
+    cached plans) or numpy.fft. Transforms use as many threads as ThreadedExecution allows: one while it is disabled
+    and inside its pool threads or the tile worker processes, which already keep every core busy.
+    """
+
+    AVAILABLE = tuple(name for name, module in (('scipy', scipy_fft), ('pyfftw', pyfftw_fft), ('numpy', np.fft))
+                      if module is not None)
+    name = AVAILABLE[0]
+
+    @classmethod
+    def use(cls, name):
+        # force a backend, e.g. numpy for results independent of the installed libraries
+        if name not in cls.AVAILABLE:
+            raise ValueError(f"FFT backend not available: {name}")
+        cls.name = name
+
+    @classmethod
+    def rfft2(cls, array, s=None, axes=(0, 1)):
+        """Half spectrum of a real array over two axes, zero padded to s when given (like numpy.fft.rfft2)."""
+        workers = ThreadedExecution.nested_workers()
+        if cls.name == 'scipy':
+            return scipy_fft.rfft2(array, s=s, axes=axes, workers=workers)
+        if cls.name == 'pyfftw':
+            return pyfftw_fft.rfft2(array, s=s, axes=axes, threads=workers)
+        return np.fft.rfft2(array, s=s, axes=axes)
+
+    @classmethod
+    def irfft2(cls, spectrum, s, axes=(0, 1)):
+        """Real array of shape s (over the two axes) from its half spectrum."""
+        workers = ThreadedExecution.nested_workers()
+        if cls.name == 'scipy':
+            return scipy_fft.irfft2(spectrum, s=s, axes=axes, workers=workers)
+        if cls.name == 'pyfftw':
+            return pyfftw_fft.irfft2(spectrum, s=s, axes=axes, threads=workers)
+        return np.fft.irfft2(spectrum, s=s, axes=axes)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def next_fast_len(length):
+        """Smallest 5-smooth length (2^a · 3^b · 5^c) not below length: sizes every FFT library handles fast."""
+        if length <= 1:
+            return 1
+
+        # try every product of powers of 3 and 5, topped up with powers of 2
+        best = 1 << (length - 1).bit_length()
+        power_5 = 1
+        while power_5 < best:
+            power_35 = power_5
+            while power_35 < best:
+                candidate = power_35
+                while candidate < length:
+                    candidate *= 2
+                best = min(best, candidate)
+                power_35 *= 3
+            power_5 *= 5
+        return best
+
+    @staticmethod
+    def fast_shape(shape):
+        return tuple(FFTBackend.next_fast_len(length) for length in shape)
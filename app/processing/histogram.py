@@ -0,0 +1,59 @@
+import numpy as np
+from app.processing.image_cache import ImageCache
+
+
+class Histogram:
+    """
+    256-bin histograms of images, with their PDF and CDF, shared by equalization, thresholding and the metrics window.
+    8-bit images are counted with np.bincount, several times faster than np.histogram's binning, straight from the
+    strided channel views without copying the channels out first.
+    Histograms are returned with the channel axes first: a grayscale image gives (256,), an RGB image (3, 256).
+    They are cached per image version and read only.
+    """
+
+    # bin edges of the 256 integer levels, like the edges np.histogram(bins=256, range=(0, 256)) returns
+    BIN_EDGES = np.arange(257, dtype=np.float64)
+
+    cache = ImageCache(max_entries=8)
+
+    @staticmethod
+    def histogram(image, cache=True):
+        """Counts of the levels 0..255 of every channel (any trailing axes of the image), shape image.shape[2:] + (256,)."""
+        if not cache:
+            return Histogram.__count(image)
+
+        def compute():
+            hist = Histogram.__count(image)
+            # the cached histogram is shared between callers, keep it read only
+            hist.setflags(write=False)
+            return hist
+
+        return Histogram.cache.get(image, 'histogram', compute)
+
+    @staticmethod
+    def pdf(image, cache=True):
+        # fraction of the pixels of every channel at each level
+        hist = Histogram.histogram(image, cache)
+        return hist / np.sum(hist, axis=-1, keepdims=True)
+
+    @staticmethod
+    def cdf(image, cache=True):
+        # fraction of the pixels of every channel at or below each level
+        return np.cumsum(Histogram.pdf(image, cache), axis=-1)
+
+    def __count(image):
+        channel_shape = image.shape[2:]
+        channel_count = int(np.prod(channel_shape, dtype=np.int64))
+        pixels = image.reshape(image.shape[:2] + (channel_count,))
+
+        # other types: values outside [0, 256) are ignored, like np.histogram with that range
+        if image.dtype != np.uint8:
+            hist = np.stack([np.histogram(pixels[:, :, c], bins=256, range=(0, 256))[0] for c in range(channel_count)])
+            return hist.reshape(channel_shape + (256,))
+
+        # one bincount per channel: offsetting the channels into a single bincount needs an index array eight times
+        # the size of the image and measured slower than counting the strided channels one after the other
+        pixels = pixels.reshape(-1, channel_count)
+        hist = np.stack([np.bincount(pixels[:, c], minlength=256) for c in range(channel_count)])
+
+        return hist.astype(np.int64, copy=False).reshape(channel_shape + (256,))
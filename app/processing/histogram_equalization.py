@@ -1,4 +1,7 @@
 import numpy as np
+from app.processing.histogram import Histogram
+from app.processing.point_operations import PointOperations
+from app.processing.threaded_execution import ThreadedExecution
 
 
 class EqualizeHistogram:
@@ -8,20 +11,12 @@ class EqualizeHistogram:
         if len(image.shape) != 2:
             raise ValueError("Input image must be a grayscale image.")
 
-        # Step 1: the number of repetitions (f) for each pixel value
-        hist, bins = np.histogram(image.flatten(), bins=256, range=[0, 256])
-
-        # Step 2: Calculate the PDF for each pixel
-        pdf = hist / np.sum(hist)
-
-        # Step 3: Calculate the CDF for each pixel
-        cdf = np.cumsum(pdf)
-
-        # Step 4: Calculate the new pixel values
-        new_pixel_values = np.round(cdf * 255).astype(np.uint8)
+        # Step 1: the number of repetitions (f) for each pixel value (cached per image)
+        # Step 2-4: its PDF, CDF and the new pixel values
+        new_pixel_values = EqualizeHistogram.lookup_table(Histogram.histogram(image))
 
         # Map the old pixel values to the new pixel values
-        equalized_image = new_pixel_values[image]
+        equalized_image = PointOperations.apply(image, new_pixel_values)
 
         return equalized_image
 
@@ -31,24 +26,90 @@ class EqualizeHistogram:
         if len(image.shape) != 3 or image.shape[2] != 3:
             raise ValueError("Input image must be an RGB image.")
 
-        # Initialize an empty array for the equalized image
-        equalized_image = np.zeros_like(image)
-
-        # Process each channel individually
-        for channel in range(3):
-            # Step 1: Calculate the histogram for the channel
-            hist, bins = np.histogram(image[:, :, channel].flatten(), bins=256, range=[0, 256])
-
-            # Step 2: Calculate the PDF for the channel
-            pdf = hist / np.sum(hist)
+        # the histograms of the three channels come from one call, each channel is equalized with its own table
+        new_pixel_values = EqualizeHistogram.lookup_table(Histogram.histogram(image))
+        equalized_image = PointOperations.apply(image, new_pixel_values)
 
-            # Step 3: Calculate the CDF for the channel
-            cdf = np.cumsum(pdf)
+        return equalized_image
 
-            # Step 4: Calculate the new pixel values
-            new_pixel_values = np.round(cdf * 255).astype(np.uint8)
+    @staticmethod
+    def lookup_table(hist):
+        """The equalization as a 256-entry table (per channel) computed from the histogram(s) of the image."""
+        # Calculate the PDF and CDF for each pixel value
+        pdf = hist / np.sum(hist, axis=-1, keepdims=True)
+        cdf = np.cumsum(pdf, axis=-1)
 
-            # Map the old pixel values to the new pixel values
-            equalized_image[:, :, channel] = new_pixel_values[image[:, :, channel]]
+        # Calculate the new pixel values
+        return np.round(cdf * 255).astype(np.uint8)
 
-        return equalized_image
+    @staticmethod
+    def clahe(image, clip_limit=2.0, tile_grid_size=(8, 8)):
+        """
+        Contrast limited adaptive histogram equalization (CLAHE) of a grayscale image, or of every channel of an RGB image.
+        The image is split in a grid of tiles; every tile gets an equalization table from its own histogram, clipped
+        at clip_limit times the average bin count with the excess spread over all bins. Every pixel then mixes the
+        tables of the four nearest tile centers bilinearly, so there are no seams between tiles. Follows cv2.createCLAHE.
+        """
+        if image.dtype != np.uint8:
+            raise ValueError("CLAHE needs an 8-bit image.")
+
+        # colour images: every channel is equalized on its own (on the thread pool when threaded execution is enabled)
+        if image.ndim >= 3:
+            channels = image.reshape(image.shape[:2] + (-1,))
+            equalized_image = ThreadedExecution.map_channels(
+                lambda channel: EqualizeHistogram.__clahe_channel(channel, clip_limit, tile_grid_size), channels)
+            return equalized_image.reshape(image.shape)
+
+        return EqualizeHistogram.__clahe_channel(image, clip_limit, tile_grid_size)
+
+    def __clahe_channel(image, clip_limit, tile_grid_size):
+        height, width = image.shape
+        # (tiles across, tiles down) like cv2
+        tiles_x, tiles_y = tile_grid_size
+
+        # tiles must split the image evenly: when they do not, the bottom and right border are extended by mirroring
+        # (like cv2, by tiles - size % tiles on both sides, a full extra tile row or column on a side that did fit)
+        padded_image = image
+        if height % tiles_y or width % tiles_x:
+            padded_image = np.pad(image, ((0, tiles_y - height % tiles_y), (0, tiles_x - width % tiles_x)), mode='reflect')
+        tile_height, tile_width = padded_image.shape[0] // tiles_y, padded_image.shape[1] // tiles_x
+        tile_area = tile_height * tile_width
+
+        # histograms of all the tiles from one bincount: the bins of tile t are t·256 .. t·256 + 255
+        tile_rows = (np.arange(tiles_y * tile_height) // tile_height * tiles_x)[:, None]
+        tile_cols = (np.arange(tiles_x * tile_width) // tile_width)[None, :]
+        bins = (tile_rows + tile_cols) * 256 + padded_image
+        hist = np.bincount(bins.ravel(), minlength=tiles_y * tiles_x * 256).reshape(tiles_y * tiles_x, 256)
+
+        # clip every histogram and hand the clipped counts back evenly, the remainder one by one to spread out bins
+        if clip_limit > 0:
+            limit = max(int(clip_limit * tile_area / 256), 1)
+            excess = np.sum(np.maximum(hist - limit, 0), axis=1)
+            hist = np.minimum(hist, limit) + (excess // 256)[:, None]
+
+            residual = excess % 256
+            step = np.maximum(256 // np.maximum(residual, 1), 1)
+            levels = np.arange(256)
+            hist += (levels % step[:, None] == 0) & (levels // step[:, None] < residual[:, None])
+
+        # equalization table of every tile, in single precision and rounded like cv2's saturate_cast
+        cdf = np.cumsum(hist, axis=1).astype(np.float32)
+        luts = np.clip(np.rint(cdf * np.float32(255.0 / tile_area)), 0, 255).astype(np.uint8).reshape(tiles_y, tiles_x, 256)
+
+        # the two nearest tile centers along every row and column and the weight of the second one
+        def neighbours(length, tile_length, tile_count):
+            position = np.arange(length, dtype=np.float32) * np.float32(1.0 / tile_length) - np.float32(0.5)
+            first = np.floor(position).astype(np.intp)
+            weight = position - first.astype(np.float32)
+            return np.clip(first, 0, tile_count - 1), np.clip(first + 1, 0, tile_count - 1), weight
+
+        y1, y2, y_weight = neighbours(height, tile_height, tiles_y)
+        x1, x2, x_weight = neighbours(width, tile_width, tiles_x)
+        y1, y2, y_weight = y1[:, None], y2[:, None], y_weight[:, None]
+
+        # bilinear mix of the four tables for every pixel at once
+        top = luts[y1, x1, image] * (1 - x_weight) + luts[y1, x2, image] * x_weight
+        bottom = luts[y2, x1, image] * (1 - x_weight) + luts[y2, x2, image] * x_weight
+        equalized_image = top * (1 - y_weight) + bottom * y_weight
+
+        return np.clip(np.rint(equalized_image), 0, 255).astype(np.uint8)
@@ -12,14 +12,16 @@ class HybridImageGenerator:
         """
         Generate a hybrid image by combining the low-frequency components of one image
         with the high-frequency components of another.
+        Returns the hybrid image together with the two filtered components it was made of. The spectra of both
+        inputs are cached by FourierFilters, so generating again with other radii skips the forward FFTs.
         """
         print("Generating hybrid image...")
         # Apply low-pass filter to the low-frequency image
-        low_freq_filtered = FourierFilters.apply_low_pass(low_freq_image, low_pass_radius)
+        self.low_frequency_image = FourierFilters.apply_low_pass(low_freq_image, low_pass_radius)
 
         # Apply high-pass filter to the high-frequency image
-        high_freq_filtered = FourierFilters.apply_high_pass(high_freq_image, high_pass_radius)
+        self.high_frequency_image = FourierFilters.apply_high_pass(high_freq_image, high_pass_radius)
 
         # Combine the two images
-        self.hybrid_image = cv2.addWeighted(low_freq_filtered, 0.5, high_freq_filtered, 0.5, 0)
-        return self.hybrid_image
+        self.hybrid_image = cv2.addWeighted(self.low_frequency_image, 0.5, self.high_frequency_image, 0.5, 0)
+        return self.hybrid_image, self.low_frequency_image, self.high_frequency_image
@@ -0,0 +1,68 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ImageCache:
+    """
+    Bounded least-recently-used cache for results derived from an image (gradients, spectra, histograms).
+    Entries are keyed by a fingerprint of the image content plus the caller's parameters, so an edited image is a
+    new version and never hits a stale entry, while the same pixels loaded again reuse the earlier result.
+    With max_bytes the arrays held are bounded as well: least recently used entries are dropped until the total
+    nbytes fits, and a value larger than the whole budget is returned without being stored.
+    """
+
+    def __init__(self, max_entries=8, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
+        # channels may be processed on several threads at once
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(image):
+        # shape, dtype and a digest of the pixels identify a version of an image
+        data = np.ascontiguousarray(image)
+        digest = hashlib.blake2b(memoryview(data).cast('B'), digest_size=16).hexdigest()
+        return data.shape, data.dtype.str, digest
+
+    def get(self, image, key, compute):
+        """Returns the cached value for (image, key), calling compute() and storing its result on a miss."""
+        entry_key = (ImageCache.fingerprint(image), key)
+        with self.lock:
+            if entry_key in self.entries:
+                self.entries.move_to_end(entry_key)
+                return self.entries[entry_key]
+
+        value = compute()
+        size = ImageCache.nbytes(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return value
+
+        with self.lock:
+            if entry_key not in self.entries:
+                self.sizes[entry_key] = size
+                self.total_bytes += size
+            self.entries[entry_key] = value
+            # drop the least recently used entries beyond the bounds
+            while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.total_bytes > self.max_bytes):
+                evicted_key, _ = self.entries.popitem(last=False)
+                self.total_bytes -= self.sizes.pop(evicted_key)
+        return value
+
+    @staticmethod
+    def nbytes(value):
+        # arrays, or tuples and lists of them (gradient pairs)
+        if isinstance(value, (tuple, list)):
+            return sum(ImageCache.nbytes(item) for item in value)
+        return getattr(value, 'nbytes', 0)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.sizes.clear()
+            self.total_bytes = 0
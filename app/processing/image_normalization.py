@@ -1,10 +1,17 @@
 import numpy as np
+from app.processing.histogram import Histogram
+from app.processing.point_operations import PointOperations
+from app.processing.threaded_execution import ThreadedExecution
 
 
 class ImageNormalization:
     @staticmethod
     def normalize_image(gray_image):
         """Normalize the image to the range [0, 255]."""
+        # 8-bit images: the minimum and maximum come from the (cached) histogram and the formula becomes a table
+        if gray_image.dtype == np.uint8:
+            return PointOperations.apply(gray_image, ImageNormalization.lookup_table(Histogram.histogram(gray_image)))
+
         # Find the minimum and maximum pixel values
         min_val = np.min(gray_image)
         max_val = np.max(gray_image)
@@ -26,19 +33,27 @@ class ImageNormalization:
         if len(image.shape) != 3 or image.shape[2] != 3:
             raise ValueError("Input image must be an RGB image.")
 
-        # Create an empty array for the normalized image
-        normalized_image = np.zeros_like(image, dtype=np.uint8)
-
-        # Process each channel individually
-        for channel in range(3):
-            # Find the minimum and maximum pixel values for the channel
-            min_val = np.min(image[:, :, channel])
-            max_val = np.max(image[:, :, channel])
+        # 8-bit images: one table per channel from the histograms of all three channels, applied in one pass
+        if image.dtype == np.uint8:
+            return PointOperations.apply(image, ImageNormalization.lookup_table(Histogram.histogram(image)))
 
-            # Apply normalization formula
-            if max_val > min_val:  # Avoid division by zero
-                normalized_image[:, :, channel] = ((image[:, :, channel] - min_val) / (max_val - min_val)) * 255
-                normalized_image[:, :, channel] = normalized_image[:, :, channel].astype(
-                    np.uint8)  # Convert to uint8 type
+        # Process each channel individually (on the thread pool when threaded execution is enabled),
+        # a channel whose values are all equal stays zero as in normalize_image
+        normalized_image = ThreadedExecution.map_channels(ImageNormalization.normalize_image, image)
 
         return normalized_image
+
+    @staticmethod
+    def lookup_table(hist):
+        """The normalization as a 256-entry table (per channel) computed from the histogram(s) of an 8-bit image."""
+        levels = np.arange(256)
+        occupied = hist > 0
+        # lowest and highest level present in every channel
+        min_val = np.argmax(occupied, axis=-1)[..., None]
+        max_val = 255 - np.argmax(occupied[..., ::-1], axis=-1)[..., None]
+
+        # the normalization formula on every level, levels outside [min, max] never occur and are clipped
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalized_levels = np.clip(((levels - min_val) / (max_val - min_val)) * 255, 0, 255)
+        # channels without contrast stay zero
+        return np.where(max_val > min_val, normalized_levels, 0).astype(np.uint8)
@@ -0,0 +1,62 @@
+import numpy as np
+from app.processing.convolution import Convolution
+
+
+class IntegralImage:
+    """
+    Summed-area table of an image: table[i, j] holds the sum of all pixels above and to the left of (i, j).
+    Once built, the sum over any rectangle costs four lookups whatever its size.
+    The first two axes are the spatial axes, any trailing channel axes get their own table.
+    """
+
+    def __init__(self, image):
+        image = np.asarray(image)
+        # integers are summed exactly in int64, everything else in float64
+        dtype = np.int64 if np.issubdtype(image.dtype, np.integer) or image.dtype == np.bool_ else np.float64
+
+        # the table has a leading row and column of zeros so that every rectangle is a plain difference
+        self.shape = image.shape
+        self.table = np.zeros((image.shape[0] + 1, image.shape[1] + 1) + image.shape[2:], dtype=dtype)
+        np.cumsum(image, axis=0, dtype=dtype, out=self.table[1:, 1:])
+        np.cumsum(self.table[1:, 1:], axis=1, out=self.table[1:, 1:])
+
+    @classmethod
+    def padded(cls, image, kernel_shape, mode='reflect', anchor=None):
+        """Builds the table of the image padded for kernel_shape, so window_sum returns one value per input pixel."""
+        return cls(Convolution.pad(image, kernel_shape, mode, anchor))
+
+    def region_sum(self, top, left, bottom, right):
+        # sum over rows [top, bottom) and columns [left, right)
+        table = self.table
+        return table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+    def window_sum(self, kernel_shape):
+        """Sums over every kernel_height×kernel_width window that fits in the image."""
+        kernel_height, kernel_width = kernel_shape
+        table = self.table
+
+        # the four corners of every window as shifted views of the table
+        bottom_right = table[kernel_height:, kernel_width:]
+        top_right = table[:-kernel_height, kernel_width:]
+        bottom_left = table[kernel_height:, :-kernel_width]
+        top_left = table[:-kernel_height, :-kernel_width]
+
+        return bottom_right - top_right - bottom_left + top_left
+
+    def window_mean(self, kernel_shape):
+        # average over every window, computed in float64
+        return self.window_sum(kernel_shape) / float(kernel_shape[0] * kernel_shape[1])
+
+    @staticmethod
+    def box_filter(image, kernel_size=3, mode='reflect'):
+        """Mean of the kernel_size×kernel_size neighbourhood of every pixel, truncated to uint8 like the other filters."""
+        kernel_shape = (kernel_size, kernel_size)
+        window_sums = IntegralImage.padded(image, kernel_shape, mode).window_sum(kernel_shape)
+
+        # integer sums are divided exactly, anything else in float64
+        if np.issubdtype(window_sums.dtype, np.integer):
+            filtered_image = window_sums // (kernel_size * kernel_size)
+        else:
+            filtered_image = window_sums / (kernel_size * kernel_size)
+
+        return np.clip(filtered_image, 0, 255).astype(np.uint8)
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class KernelDecomposition:
+    """
+    Splits a 2D kernel into a short sum of outer products column ⊗ row.
+    A kernel of rank r can then be applied as r column passes and r row passes, O(r·(kh + kw)) per pixel instead of O(kh·kw).
+    """
+
+    @staticmethod
+    def rank(kernel, tolerance=1e-6):
+        # numerical rank: singular values that are not negligible next to the largest one
+        singular_values = np.linalg.svd(np.asarray(kernel, dtype=np.float64), compute_uv=False)
+        if singular_values[0] == 0:
+            return 0
+        return int(np.count_nonzero(singular_values > tolerance * singular_values[0]))
+
+    @staticmethod
+    def is_separable(kernel, tolerance=1e-6):
+        return KernelDecomposition.rank(kernel, tolerance) <= 1
+
+    @staticmethod
+    def decompose(kernel, max_rank=2, tolerance=1e-6):
+        """
+        Returns a list of (column, row) pairs whose outer products add up to the kernel,
+        or None when the kernel needs more than max_rank terms.
+        """
+        kernel = np.asarray(kernel)
+
+        # rank-1 kernels with exact factors (sobel, prewitt, box) keep their own dtype so integer kernels stay exact
+        exact_terms = KernelDecomposition.__exact_rank_one(kernel)
+        if exact_terms is not None:
+            return exact_terms
+
+        # arbitrary kernels: keep the leading singular triplets and split each singular value between both factors
+        u, singular_values, vt = np.linalg.svd(kernel.astype(np.float64))
+        if singular_values[0] == 0:
+            return []
+        rank = int(np.count_nonzero(singular_values > tolerance * singular_values[0]))
+        if rank > max_rank:
+            return None
+
+        terms = []
+        for i in range(rank):
+            scale = np.sqrt(singular_values[i])
+            terms.append((u[:, i] * scale, vt[i] * scale))
+        return terms
+
+    def __exact_rank_one(kernel):
+        # take the column and row through the largest entry as factors, the pivot is divided out of one of them
+        if not np.any(kernel):
+            return None
+        pivot_row, pivot_column = np.unravel_index(np.argmax(np.abs(kernel)), kernel.shape)
+        column = kernel[:, pivot_column]
+        row = kernel[pivot_row]
+        pivot = kernel[pivot_row, pivot_column]
+
+        if np.issubdtype(kernel.dtype, np.integer):
+            # integer kernels only split exactly when the row or the column divides evenly by the pivot
+            if not np.any(row % pivot):
+                row = row // pivot
+            elif not np.any(column % pivot):
+                column = column // pivot
+            else:
+                return None
+        else:
+            row = row / pivot
+
+        # the factors are only used if they rebuild the kernel exactly
+        if not np.array_equal(np.outer(column, row), kernel):
+            return None
+        return [(column, row)]
@@ -0,0 +1,179 @@
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from app.processing.convolution import Convolution
+from app.processing.threaded_execution import ThreadedExecution
+
+
+class MedianFilter:
+    """
+    Median engine used by Denoise.apply_median_filter.
+    Small kernels are handled by a vectorized partition over strided windows, larger kernels on 8-bit images
+    by a sliding column histogram (Perreault-Hébert) whose cost per pixel does not depend on the kernel size.
+    The partition copies kernel_size² samples per pixel, so it runs over bands of rows whose copy stays within
+    PARTITION_MAX_BYTES.
+    """
+
+    # memory the window copy of one band of the partition path may take
+    PARTITION_MAX_BYTES = 64 * 2 ** 20
+
+    # largest kernel size that is still faster with the partition path on 8-bit images. the crossover depends on
+    # the host (measured between 10 and 15 on 1 MP images), calibrate() measures it on this one
+    PARTITION_MAX_KERNEL_SIZE = 11
+
+    @staticmethod
+    def apply(image, kernel_size=3, mode='reflect', method=None):
+        # choose the engine automatically unless the caller forces one
+        if method is None:
+            method = MedianFilter.choose_method(image, kernel_size)
+
+        if method == 'partition':
+            return MedianFilter.partition_median(image, kernel_size, mode)
+        if method == 'histogram':
+            return MedianFilter.histogram_median(image, kernel_size, mode)
+        raise ValueError(f"Unknown median method: {method}")
+
+    @staticmethod
+    def choose_method(image, kernel_size):
+        # the histogram engine only works on 8-bit images and only pays off for large windows,
+        # or when even a single row of windows would not fit the partition memory budget
+        if image.dtype != np.uint8:
+            return 'partition'
+        if kernel_size <= MedianFilter.PARTITION_MAX_KERNEL_SIZE and MedianFilter.__band_rows(image, kernel_size) > 0:
+            return 'partition'
+        return 'histogram'
+
+    @classmethod
+    def calibrate(cls, image_size=512, max_kernel_size=31, repeats=2):
+        """
+        Times both engines on this host for growing kernel sizes and sets PARTITION_MAX_KERNEL_SIZE to the largest
+        size at which the partition path is still faster. The partition runs in bands within PARTITION_MAX_BYTES like
+        it does in use, so the timings include the banding. The measured size is returned.
+        """
+        rng = np.random.default_rng(0)
+        image = rng.integers(0, 256, (image_size, image_size), dtype=np.uint8)
+
+        # the partition cost grows with the window area while the histogram cost stays flat: stop at the first
+        # kernel size where the histogram engine wins
+        crossover = max_kernel_size
+        for kernel_size in range(3, max_kernel_size + 1, 2):
+            partition = min(cls.__time(lambda: cls.partition_median(image, kernel_size)) for _ in range(repeats))
+            histogram = min(cls.__time(lambda: cls.histogram_median(image, kernel_size)) for _ in range(repeats))
+            if histogram < partition:
+                crossover = kernel_size - 1
+                break
+
+        cls.PARTITION_MAX_KERNEL_SIZE = crossover
+        return crossover
+
+    @staticmethod
+    def partition_median(image, kernel_size=3, mode='reflect'):
+        padded_image = Convolution.pad(image, (kernel_size, kernel_size), mode)
+        height = image.shape[0]
+        filtered_image = np.empty(image.shape, dtype=np.uint8)
+
+        # bands of rows whose window copy fits the memory budget, at least one row at a time
+        band_rows = max(MedianFilter.__band_rows(image, kernel_size), 1)
+        for top in range(0, height, band_rows):
+            bottom = min(top + band_rows, height)
+            band = padded_image[top:bottom + kernel_size - 1]
+            filtered_image[top:bottom] = MedianFilter.__partition_band(band, kernel_size, (bottom - top,) + image.shape[1:])
+
+        return filtered_image
+
+    def __partition_band(band, kernel_size, shape):
+        # the kernel_size×kernel_size neighbourhood of every pixel of the band, flattened to one axis.
+        # the reshape copies the strided view (a 1×1 window stays a view and is copied here), the partition then
+        # works in that copy
+        windows = sliding_window_view(band, (kernel_size, kernel_size), axis=(0, 1))
+        windows = windows.reshape(shape + (kernel_size * kernel_size,))
+        if not windows.flags.writeable:
+            windows = windows.copy()
+
+        count = kernel_size * kernel_size
+        middle = count // 2
+
+        # odd window: the middle element after a partial sort is the median
+        if count % 2 == 1:
+            windows.partition(middle, axis=-1)
+            filtered_band = windows[..., middle]
+        # even window: the median is the mean of the two middle elements (same as np.median)
+        else:
+            windows.partition((middle - 1, middle), axis=-1)
+            filtered_band = (windows[..., middle - 1].astype(np.float64) + windows[..., middle]) / 2
+
+        return np.clip(filtered_band, 0, 255).astype(np.uint8)
+
+    def __band_rows(image, kernel_size):
+        # rows of output whose windows fit PARTITION_MAX_BYTES (0 when not even one row does)
+        row_bytes = int(np.prod(image.shape[1:], dtype=np.int64)) * kernel_size * kernel_size * image.dtype.itemsize
+        return MedianFilter.PARTITION_MAX_BYTES // max(row_bytes, 1)
+
+    @staticmethod
+    def histogram_median(image, kernel_size=3, mode='reflect'):
+        if image.dtype != np.uint8:
+            raise ValueError("The histogram median needs an 8-bit image.")
+
+        # filter every channel (any trailing axes) as an independent 2D image, on threads when enabled
+        channels = image.reshape(image.shape[:2] + (-1,))
+        filtered_image = ThreadedExecution.map_channels(
+            lambda channel: MedianFilter.__histogram_median_channel(channel, kernel_size, mode), channels)
+
+        return filtered_image.reshape(image.shape)
+
+    def __histogram_median_channel(channel, kernel_size, mode):
+        height, width = channel.shape
+        padded_channel = Convolution.pad(channel, (kernel_size, kernel_size), mode)
+        padded_width = padded_channel.shape[1]
+        columns = np.arange(padded_width)
+
+        # one 256-bin histogram per padded column, covering the kernel_size rows of the current window.
+        # counts are kept in uint16: the column sums below wrap around, but differences of them are exact
+        # as long as a window holds fewer than 65536 pixels
+        column_histograms = np.zeros((padded_width, 256), dtype=np.uint16)
+        for i in range(kernel_size):
+            column_histograms[columns, padded_channel[i]] += 1
+
+        # rank(s) of the median inside a window, the even case averages the two middle ranks like np.median
+        count = kernel_size * kernel_size
+        ranks = (count // 2,) if count % 2 == 1 else (count // 2 - 1, count // 2)
+
+        filtered_channel = np.empty((height, width), dtype=np.uint8)
+        running_sums = np.zeros((padded_width + 1, 256), dtype=np.uint16)
+        for i in range(height):
+            # slide the window one row down: every column histogram drops its top pixel and gains a new bottom one
+            if i > 0:
+                column_histograms[columns, padded_channel[i - 1]] -= 1
+                column_histograms[columns, padded_channel[i + kernel_size - 1]] += 1
+
+            # window histogram of every output column as a difference of running column sums
+            np.cumsum(column_histograms, axis=0, dtype=np.uint16, out=running_sums[1:])
+            window_histograms = running_sums[kernel_size:] - running_sums[:-kernel_size]
+
+            values = [MedianFilter.__select_rank(window_histograms, rank) for rank in ranks]
+            if len(values) == 1:
+                filtered_channel[i] = values[0]
+            else:
+                filtered_channel[i] = (values[0].astype(np.uint16) + values[1]) // 2
+
+        return filtered_channel
+
+    def __select_rank(window_histograms, rank):
+        # two level search: locate the coarse block of 16 bins holding the rank, then the bin inside it
+        width = window_histograms.shape[0]
+        blocks = window_histograms.reshape(width, 16, 16)
+
+        coarse_cdf = np.cumsum(blocks.sum(axis=2, dtype=np.int32), axis=1)
+        coarse_bin = np.count_nonzero(coarse_cdf <= rank, axis=1)
+        below = np.where(coarse_bin > 0, coarse_cdf[np.arange(width), coarse_bin - 1], 0)
+
+        fine_cdf = np.cumsum(blocks[np.arange(width), coarse_bin], axis=1, dtype=np.int32) + below[:, None]
+        fine_bin = np.count_nonzero(fine_cdf <= rank, axis=1)
+
+        return (coarse_bin * 16 + fine_bin).astype(np.uint8)
+
+    def __time(run):
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
@@ -1,90 +1,173 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
+from app.processing.parallel import ParallelExecutor
+from app.processing.tiling import TiledProcessor
 
 
 class AddingNoise:
+    """
+    Noise generators built on a numpy Generator: pass rng to draw from an existing stream, or seed (an int or a
+    SeedSequence) to get a reproducible one, by default every call draws fresh noise.
+    Pixel values saturate at 0 and 255. out may be a preallocated uint8 array of the image's shape (or the image
+    itself) to write the noisy image into, otherwise a new array is returned.
+    add_noise_tiled and add_noise_frames split the work over a fixed grid of tiles (or over frames), each with its
+    own stream spawned from one SeedSequence, so the result is bit-identical for any number of workers.
+    """
+
+    # noise tiles: the grid, and with it the result, must not depend on the worker count
+    TILE_SIZE = 256
+
     @staticmethod
-    def add_uniform_noise(image, noise_amount=0.5):
+    def add_uniform_noise(image, noise_amount=0.5, seed=None, rng=None, out=None):
+        rng = AddingNoise.__generator(seed, rng)
+
         # calculate the maximum value of noise pixel values
         high = int(noise_amount * 100)
 
-        # creates an array of the same size of image with uniformly distributed random values between -high and high
-        noise = np.random.uniform(-high, high, image.shape).astype(np.int16)
-
-        # adds these random values onto the image
-        noisy_image = cv2.add(image.astype(np.int16), noise)
+        # creates an array of the same size of image with uniformly distributed integers between -high and high
+        noise = rng.integers(-high, high, size=image.shape, dtype=np.int16, endpoint=True)
 
-        # Converts the noisy image back to the uint8 range and clips values to this range.
-        return cv2.convertScaleAbs(noisy_image)
+        # adds these random values onto the image, saturating at 0 and 255
+        return AddingNoise.__saturating_add(image, noise, out)
 
     @staticmethod
-    def add_gaussian_noise(image, mean=0.0, sigma=0.5):
+    def add_gaussian_noise(image, mean=0.0, sigma=0.5, seed=None, rng=None, out=None):
+        rng = AddingNoise.__generator(seed, rng)
+
         # creates an array of the same size of image with normally distributed random values
         # the mean and std determine the gaussian distribution shape (bell curve)
-        gaussian = np.random.normal(mean, sigma, image.shape).astype(np.int16)
-
-        # add noise onto the image
-        noisy_image = cv2.add(image.astype(np.int16), gaussian)
+        gaussian = rng.standard_normal(size=image.shape, dtype=np.float32)
+        gaussian *= sigma
+        gaussian += mean
+        # truncated to whole levels, beyond ±255 the result saturates anyway
+        np.clip(gaussian, -255, 255, out=gaussian)
 
-        return cv2.convertScaleAbs(noisy_image)
+        # add noise onto the image, saturating at 0 and 255
+        return AddingNoise.__saturating_add(image, gaussian.astype(np.int16), out)
 
     @staticmethod
-    def add_salt_and_pepper_noise(image, noise_amount=0.5):
+    def add_salt_and_pepper_noise(image, noise_amount=0.5, seed=None, rng=None, out=None):
+        rng = AddingNoise.__generator(seed, rng)
+
         # determines the probability of salt and pepper to be 5% of the percentage defined by the user.
         salt_prob = noise_amount * 0.05
         pepper_prob = salt_prob
 
-        # takes a copy of the image
-        noisy_image = image.copy()
+        # starts from a copy of the image (or the image itself when it is the output)
+        noisy_image = AddingNoise.__output(image, out)
+        if noisy_image is not image:
+            np.copyto(noisy_image, image)
         h, w = image.shape[:2]
 
-        # Check if the image is grayscale or RGB
-        if len(image.shape) == 2:
-            channels = 1
-        else:
-            channels = image.shape[2]
+        # every trailing axis is a channel, a grayscale image has one
+        channels = int(np.prod(image.shape[2:], dtype=np.int64))
+        pixels = noisy_image.reshape(h * w, channels)
 
-            # calculate number of salt and pepper pixels
+        # calculate number of salt and pepper pixels
         num_salt = int(salt_prob * h * w * channels)
         num_pepper = int(pepper_prob * h * w * channels)
 
-        # Add salt (white) noise
-        # initialize arrays that will hold the coordinates of the salt row and col pixels
-        salt_rows = []
-        salt_cols = []
-        for i in range(num_salt):
-            # for the amount of salt pixels, append the arrays with random values around the image coordinates
-            salt_rows.append(np.random.randint(0, h))
-            salt_cols.append(np.random.randint(0, w))
-        # join the row and col arrays into one array for efficiency
-        salt_coords = [np.array(salt_rows), np.array(salt_cols)]
-
-        if channels > 1:
-            # if the image is RGB, create an array of size of salt pixels with random values ranging from 0 to 2 (or num of channels -1)
-            salt_channels = np.random.randint(0, channels, num_salt)
-            # finally in the noisy image, assign the randomly determined coordinates with value 255 (for white)
-            # the salt_channels coordinate determines which channel of the 3 should be set to white
-            noisy_image[tuple(salt_coords) + (salt_channels,)] = 255
-        else:
-            # for a grayscale image, assign 255 to the random coordinates directly
-            noisy_image[tuple(salt_coords)] = 255
-
-        # Add pepper (black) noise
-        # initialize arrays that will hold the coordinates of the pepper row and col pixels
-        pepper_rows = []
-        pepper_cols = []
-        for i in range(num_pepper):
-            # for the amount of pepper pixels, append the arrays with random values around the image coordinates
-            pepper_rows.append(np.random.randint(0, h))
-            pepper_cols.append(np.random.randint(0, w))
-        pepper_coords = [np.array(pepper_rows), np.array(pepper_cols)]
-
-        # finally in the noisy image, assign the randomly determined coordinates with value 0 (for black)
-        if channels > 1:
-            pepper_channels = np.random.randint(0, channels, num_pepper)
-            noisy_image[tuple(pepper_coords) + (pepper_channels,)] = 0
-        else:
-            noisy_image[tuple(pepper_coords)] = 0
+        # Add salt (white) noise: all random pixel positions (and channels) are drawn in one call,
+        # then set to 255 in one assignment. positions may repeat, like independent draws
+        salt_pixels = rng.integers(0, h * w, size=num_salt)
+        salt_channels = rng.integers(0, channels, size=num_salt)
+        pixels[salt_pixels, salt_channels] = 255
+
+        # Add pepper (black) noise the same way
+        pepper_pixels = rng.integers(0, h * w, size=num_pepper)
+        pepper_channels = rng.integers(0, channels, size=num_pepper)
+        pixels[pepper_pixels, pepper_channels] = 0
 
         # return the noisy image
         return noisy_image
+
+    @staticmethod
+    def spawn_streams(seed, count):
+        """
+        The first count child SeedSequences of seed (an int, a SeedSequence or None for fresh entropy).
+        Unlike SeedSequence.spawn it does not advance the parent, the same seed always gives the same children.
+        """
+        parent = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        return [np.random.SeedSequence(parent.entropy, spawn_key=parent.spawn_key + (index,), pool_size=parent.pool_size)
+                for index in range(count)]
+
+    @staticmethod
+    def add_noise_tiled(image, generator, seed=None, workers=1, processes=False, tile_size=TILE_SIZE, out=None, **kwargs):
+        """
+        Adds noise with generator (one of the add_*_noise functions) tile by tile, every tile drawing from its own
+        stream. workers threads (or processes, sharing the image through shared memory) handle the tiles;
+        the tile grid is fixed by tile_size, so any worker count gives the same image for the same seed.
+        """
+        tiles = list(TiledProcessor.tiles(image.shape, tile_size))
+        streams = AddingNoise.spawn_streams(seed, len(tiles))
+
+        if processes:
+            with ParallelExecutor(workers, tile_size) as executor:
+                noisy_image = executor.apply(image, generator, halo=0, tile_arguments=[{'seed': stream} for stream in streams], **kwargs)
+            if out is None:
+                return noisy_image
+            np.copyto(AddingNoise.__output(image, out), noisy_image)
+            return out
+
+        noisy_image = AddingNoise.__output(image, out)
+
+        def run_tile(index):
+            tile = tiles[index][0]
+            noisy_image[tile] = generator(np.ascontiguousarray(image[tile]), seed=streams[index], **kwargs)
+
+        AddingNoise.__run(run_tile, len(tiles), workers)
+        return noisy_image
+
+    @staticmethod
+    def add_noise_frames(frames, generator, seed=None, workers=1, **kwargs):
+        """
+        Adds noise to every frame (an N×H×W(×C) stack or a list of images) with its own stream, on workers threads.
+        Frame i always gets the same noise for the same seed, whatever the worker count.
+        """
+        streams = AddingNoise.spawn_streams(seed, len(frames))
+        noisy_frames = [None] * len(frames)
+
+        def run_frame(index):
+            noisy_frames[index] = generator(frames[index], seed=streams[index], **kwargs)
+
+        AddingNoise.__run(run_frame, len(frames), workers)
+        return np.stack(noisy_frames) if isinstance(frames, np.ndarray) else noisy_frames
+
+    def __run(function, count, workers):
+        # the generators and opencv release the GIL while they fill arrays, threads run them side by side
+        if workers <= 1 or count < 2:
+            for index in range(count):
+                function(index)
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(function, range(count)))
+
+    def __generator(seed, rng):
+        # an explicit generator wins, otherwise a new one from the seed (fresh entropy when it is None)
+        return rng if rng is not None else np.random.default_rng(seed)
+
+    def __output(image, out):
+        # a contiguous uint8 buffer, written through reshaped views
+        if out is None:
+            return np.empty(image.shape, dtype=np.uint8)
+        if out.shape != image.shape or out.dtype != np.uint8 or not out.flags.c_contiguous:
+            raise ValueError("The output must be a contiguous uint8 array of the image's shape.")
+        return out
+
+    def __saturating_add(image, noise, out):
+        noisy_image = AddingNoise.__output(image, out)
+
+        # the positive and negative parts of the noise as uint8, added and subtracted with saturation in place
+        positive = np.clip(noise, 0, 255).astype(np.uint8)
+        negative = np.clip(noise, -255, 0)
+        np.negative(negative, out=negative)
+        negative = negative.astype(np.uint8)
+
+        # elementwise operations: every layout works as a 2D array for opencv
+        rows = image.shape[0]
+        destination = noisy_image.reshape(rows, -1)
+        cv2.add(np.ascontiguousarray(image).reshape(rows, -1), positive.reshape(rows, -1), dst=destination)
+        cv2.subtract(destination, negative.reshape(rows, -1), dst=destination)
+        return noisy_image
@@ -0,0 +1,112 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from app.processing.threaded_execution import ThreadedExecution
+from app.processing.tiling import TiledProcessor
+
+
+class ParallelExecutor:
+    """
+    Runs a neighbourhood operation over halo-padded tiles on a pool of worker processes.
+    Input and output live in multiprocessing.shared_memory, so workers only receive the buffer names and tile
+    coordinates and never pickle pixel data. The operation must be picklable (a module level function or a
+    static method such as Denoise.apply_median_filter).
+    The output is identical to a single process run: each tile is computed exactly as in TiledProcessor.
+    """
+
+    def __init__(self, workers=None, tile_size=512):
+        self.workers = workers or os.cpu_count() or 1
+        self.tile_size = tile_size
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def shutdown(self):
+        # the pool is kept alive between calls, release the worker processes
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def apply(self, image, operation, halo=None, tile_arguments=None, **kwargs):
+        """
+        Applies operation(block, **kwargs) to every tile in parallel and returns the assembled output.
+        tile_arguments optionally holds one dict of extra keyword arguments per tile (picklable), in the order of
+        TiledProcessor.tiles().
+        """
+        if halo is None:
+            halo = TiledProcessor.radius(operation, **kwargs)
+
+        tiles = list(TiledProcessor.tiles(image.shape, self.tile_size, halo))
+        # nothing to split: run in this process and skip the pool start up
+        if self.workers == 1 or len(tiles) == 1:
+            return TiledProcessor.apply(image, operation, self.tile_size, halo, tile_arguments=tile_arguments, **kwargs)
+
+        # every tile travels with its own extra arguments
+        tiles = [tiles[i] + ({} if tile_arguments is None else tile_arguments[i],) for i in range(len(tiles))]
+
+        # the first tile runs here, it also tells the output type and channel layout
+        tile, block, inner, arguments = tiles[0]
+        first_result = operation(np.ascontiguousarray(image[block]), **{**kwargs, **arguments})
+        output_shape = image.shape[:2] + first_result.shape[2:]
+
+        input_memory = shared_memory.SharedMemory(create=True, size=max(image.nbytes, 1))
+        output_memory = shared_memory.SharedMemory(create=True, size=max(int(np.prod(output_shape)) * first_result.dtype.itemsize, 1))
+        try:
+            shared_input = np.ndarray(image.shape, dtype=image.dtype, buffer=input_memory.buf)
+            shared_input[...] = image
+            shared_output = np.ndarray(output_shape, dtype=first_result.dtype, buffer=output_memory.buf)
+            shared_output[tile] = first_result[inner]
+
+            input_spec = (input_memory.name, image.shape, image.dtype.str)
+            output_spec = (output_memory.name, output_shape, first_result.dtype.str)
+
+            # a few tiles per task keeps every worker busy until the end without flooding the queue
+            remaining = tiles[1:]
+            chunk = max(1, len(remaining) // (self.workers * 4))
+            futures = [self.__get_pool().submit(ParallelExecutor._run_tiles, input_spec, output_spec, operation, kwargs, remaining[i:i + chunk])
+                       for i in range(0, len(remaining), chunk)]
+            for future in futures:
+                future.result()
+
+            output = shared_output.copy()
+            # drop the views before the shared buffers are released
+            del shared_input, shared_output
+        finally:
+            input_memory.close()
+            input_memory.unlink()
+            output_memory.close()
+            output_memory.unlink()
+
+        return output
+
+    def __get_pool(self):
+        # the pool is created on first use and reused by later calls
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self.pool
+
+    @staticmethod
+    def _run_tiles(input_spec, output_spec, operation, kwargs, tiles):
+        # worker side: the processes already use every core, so no channel threads on top of them
+        ThreadedExecution.disable()
+
+        # attach to the shared buffers, process the tiles in place and detach
+        input_name, input_shape, input_dtype = input_spec
+        output_name, output_shape, output_dtype = output_spec
+        input_memory = shared_memory.SharedMemory(name=input_name)
+        output_memory = shared_memory.SharedMemory(name=output_name)
+        try:
+            image = np.ndarray(input_shape, dtype=input_dtype, buffer=input_memory.buf)
+            output = np.ndarray(output_shape, dtype=output_dtype, buffer=output_memory.buf)
+            for tile, block, inner, arguments in tiles:
+                output[tile] = operation(np.ascontiguousarray(image[block]), **{**kwargs, **arguments})[inner]
+            del image, output
+        finally:
+            input_memory.close()
+            output_memory.close()
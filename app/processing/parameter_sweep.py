@@ -0,0 +1,147 @@
+import math
+
+import cv2
+import numpy as np
+from app.processing.convolution import Convolution
+from app.processing.denoise import Denoise
+from app.processing.fourier_filers import FourierFilters
+from app.processing.integral_image import IntegralImage
+from app.processing.thresholding import Thresholding
+from app.processing.threaded_execution import ThreadedExecution
+
+
+class ParameterSweep:
+    """
+    Runs one operation on one image for a whole list of parameter values and returns the N×H×W(×C) result stack,
+    sharing the work the variants have in common: one forward FFT for every filter radius, one lookup table stack
+    for every global threshold, one integral image for every average kernel size.
+    Results are identical to calling the operation once per value, unless the gaussian sweep is asked to be progressive.
+    """
+
+    # operations with a dedicated sweep: (swept parameter, sweep over a list of values)
+    SWEEPS = {
+        FourierFilters.apply_low_pass: ('radius', lambda image, values, **kwargs: ParameterSweep.low_pass(image, values, **kwargs)),
+        FourierFilters.apply_high_pass: ('radius', lambda image, values, **kwargs: ParameterSweep.high_pass(image, values, **kwargs)),
+        Thresholding.global_threshold: ('threshold_value', lambda image, values, **kwargs: ParameterSweep.global_threshold(image, values, **kwargs)),
+        Denoise.apply_average_filter: ('kernel_size', lambda image, values, **kwargs: ParameterSweep.average(image, values, **kwargs)),
+        Denoise.apply_gaussian_filter: ('sigma', lambda image, values, **kwargs: ParameterSweep.gaussian(image, values, **kwargs)),
+        Denoise.apply_median_filter: ('kernel_size', lambda image, values, **kwargs: ParameterSweep.median(image, values, **kwargs)),
+    }
+
+    @staticmethod
+    def run(image, operation, parameter, values, **kwargs):
+        """
+        Returns np.stack([operation(image, parameter=value, **kwargs) for value in values]).
+        Operations without a dedicated sweep are called once per value (concurrently when threading is enabled).
+        kwargs reach the dedicated sweeps too, which raise a TypeError for arguments they do not support.
+        """
+        values = list(values)
+        if operation in ParameterSweep.SWEEPS and ParameterSweep.SWEEPS[operation][0] == parameter:
+            return ParameterSweep.SWEEPS[operation][1](image, values, **kwargs)
+
+        return np.stack(ThreadedExecution.map(lambda value: operation(image, **{parameter: value}, **kwargs), values))
+
+    @staticmethod
+    def low_pass(image, radii):
+        # one forward spectrum for the whole sweep, held here rather than in the spectrum cache:
+        # every radius only costs a mask multiply and an inverse fft
+        spectrum = FourierFilters.get_rfft(image, cache=False)
+        return np.stack(ThreadedExecution.map(lambda radius: FourierFilters.apply_low_pass(image, radius, spectrum=spectrum), radii))
+
+    @staticmethod
+    def high_pass(image, radii):
+        spectrum = FourierFilters.get_rfft(image, cache=False)
+        return np.stack(ThreadedExecution.map(lambda radius: FourierFilters.apply_high_pass(image, radius, spectrum=spectrum), radii))
+
+    @staticmethod
+    def global_threshold(image, threshold_values):
+        if image.dtype != np.uint8:
+            return np.stack([Thresholding.global_threshold(image, value) for value in threshold_values])
+
+        # one 256-entry table per threshold, every result is a single lookup of the image in its row
+        levels = np.arange(256)
+        tables = np.where(levels[None, :] > np.asarray(threshold_values, dtype=np.float64)[:, None], 255, 0).astype(np.uint8)
+        return tables[:, image]
+
+    @staticmethod
+    def average(image, kernel_sizes):
+        """Average filters of every kernel size from a single integral image of the image padded for the largest one."""
+        height, width = image.shape[:2]
+        # reflect padding of the largest kernel contains the padding of every smaller one around the same center
+        margin = max(kernel_size // 2 for kernel_size in kernel_sizes)
+        table = IntegralImage(Convolution.pad(image, (2 * margin + 1, 2 * margin + 1), mode='reflect')).table
+
+        def window_average(kernel_size):
+            # first padded row and column of the window of output pixel (0, 0)
+            start = margin - kernel_size // 2
+            top, bottom = slice(start, start + height), slice(start + kernel_size, start + kernel_size + height)
+            left, right = slice(start, start + width), slice(start + kernel_size, start + kernel_size + width)
+            window_sums = table[bottom, right] - table[top, right] - table[bottom, left] + table[top, left]
+
+            # the same division and truncation as IntegralImage.box_filter
+            if np.issubdtype(window_sums.dtype, np.integer):
+                filtered_image = window_sums // (kernel_size * kernel_size)
+            else:
+                filtered_image = window_sums / (kernel_size * kernel_size)
+            return np.clip(filtered_image, 0, 255).astype(np.uint8)
+
+        return np.stack([window_average(kernel_size) for kernel_size in kernel_sizes])
+
+    @staticmethod
+    def gaussian(image, sigmas, kernel_size=None, progressive=False):
+        """
+        Gaussian blurs for a list of sigmas, by default exact apply_gaussian_filter calls with kernel_size (3 when
+        not given, like the filter itself).
+        With progressive=True the blurs are built progressively instead: a gaussian of sigma b is the gaussian of
+        sigma a blurred again with sqrt(b² - a²), so every step only convolves the previous (unrounded) result with
+        a small kernel. Kernels cover ±3 sigma, results approximate apply_gaussian_filter(image, 2·ceil(3σ)+1, σ)
+        within a few levels, so a kernel_size cannot be combined with it.
+        """
+        if not progressive:
+            kernel_size = kernel_size if kernel_size is not None else 3
+            return np.stack(ThreadedExecution.map(lambda sigma: Denoise.apply_gaussian_filter(image, kernel_size, sigma), sigmas))
+        if kernel_size is not None:
+            raise ValueError("The progressive gaussian sweep chooses its own kernel sizes, kernel_size cannot be set.")
+
+        results = [None] * len(sigmas)
+        blurred = image.astype(np.float32)
+        previous_sigma = 0.0
+        # increasing sigmas, every step starts from the blur before it
+        for index in sorted(range(len(sigmas)), key=lambda i: sigmas[i]):
+            step_sigma = math.sqrt(max(sigmas[index] ** 2 - previous_sigma ** 2, 0.0))
+            if step_sigma > 0:
+                step_size = 2 * math.ceil(3 * step_sigma) + 1
+                kernel = Denoise.gaussian_kernel_1d(step_size, step_sigma)
+                blurred = Convolution.convolve_separable(blurred, [(kernel, kernel)], mode='reflect')
+                previous_sigma = sigmas[index]
+            results[index] = np.clip(blurred, 0, 255).astype(np.uint8)
+
+        return np.stack(results)
+
+    @staticmethod
+    def median(image, kernel_sizes):
+        # the medians share nothing but the image, run them concurrently when threading is enabled
+        return np.stack(ThreadedExecution.map(lambda kernel_size: Denoise.apply_median_filter(image, kernel_size), kernel_sizes))
+
+    @staticmethod
+    def contact_sheet(stack, columns=None, labels=None, spacing=4):
+        """Arranges the variants of a sweep in a grid image, optionally writing a label on every cell."""
+        count, height, width = stack.shape[:3]
+        columns = columns or math.ceil(math.sqrt(count))
+        rows = math.ceil(count / columns)
+
+        sheet = np.zeros((rows * (height + spacing) + spacing, columns * (width + spacing) + spacing) + stack.shape[3:], dtype=stack.dtype)
+        for index in range(count):
+            top = spacing + (index // columns) * (height + spacing)
+            left = spacing + (index % columns) * (width + spacing)
+            cell = sheet[top:top + height, left:left + width]
+            cell[...] = stack[index]
+
+            if labels is not None:
+                # white text with a black outline stays readable on any image
+                colour = 255 if stack.ndim == 3 else (255,) * stack.shape[3]
+                outline = 0 if stack.ndim == 3 else (0,) * stack.shape[3]
+                cv2.putText(cell, str(labels[index]), (4, 16), cv2.FONT_HERSHEY_SIMPLEX, 0.5, outline, 3, cv2.LINE_AA)
+                cv2.putText(cell, str(labels[index]), (4, 16), cv2.FONT_HERSHEY_SIMPLEX, 0.5, colour, 1, cv2.LINE_AA)
+
+        return sheet
@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+from app.processing.histogram import Histogram
+
+
+class PointOperations:
+    """
+    Composition of uint8 → uint8 point operations as 256-entry lookup tables.
+    An operation is a function from the histogram(s) of its input, shape (channels, 256), to its table(s): fixed
+    operations (global threshold) ignore the histogram, data dependent ones (equalization, normalization) build their
+    table from it. A chain is collapsed into a single table per channel without touching the image: the histogram
+    seen by every operation is the input histogram pushed through the tables before it. The image is then read once.
+
+        tables = PointOperations.compose(image, [EqualizeHistogram.lookup_table,
+                                                 lambda hist: Thresholding.global_threshold_table(128)])
+        output = PointOperations.apply(image, tables)
+    """
+
+    # cv2.LUT handles up to 4 channels per pixel with one table each
+    CV2_MAX_CHANNELS = 4
+
+    @staticmethod
+    def compose(image, operations):
+        """Returns the tables of the whole chain, shape (256,) for a grayscale image or (channels, 256)."""
+        # histogram of every channel of the input (cached per image version)
+        hist = Histogram.histogram(image)
+        hist = hist.reshape(-1, 256).astype(np.float64)
+        channels = np.arange(hist.shape[0])[:, None]
+
+        # start from the identity: every level maps to itself
+        tables = np.broadcast_to(np.arange(256, dtype=np.uint8), hist.shape).copy()
+        for operation in operations:
+            operation_tables = np.broadcast_to(operation(hist), hist.shape)
+
+            # the chain so far followed by this operation: level u goes to operation(tables[u])
+            tables = operation_tables[channels, tables]
+            # histogram of this operation's output: the counts of every level move to the level it maps to
+            hist = np.stack([np.bincount(operation_tables[c], weights=hist[c], minlength=256) for c in range(hist.shape[0])])
+
+        return tables.reshape(image.shape[2:] + (256,))
+
+    @staticmethod
+    def apply(image, tables):
+        """Maps every pixel through the table of its channel in a single pass (cv2.LUT for up to 4 channels)."""
+        channel_shape = image.shape[2:]
+        channel_count = int(np.prod(channel_shape, dtype=np.int64))
+        use_cv2 = image.dtype == np.uint8 and tables.dtype == np.uint8 and channel_count <= PointOperations.CV2_MAX_CHANNELS
+
+        # a single table is shared by all channels
+        if tables.ndim == 1:
+            if use_cv2:
+                return cv2.LUT(image.reshape(image.shape[:2] + (channel_count,)), tables).reshape(image.shape)
+            return np.take(tables, image)
+
+        # one table per channel
+        tables = tables.reshape(channel_count, 256)
+        if use_cv2:
+            # interleaved as a 1×256 table with the image's channels
+            lut = np.ascontiguousarray(tables.T).reshape(1, 256, channel_count)
+            return cv2.LUT(image.reshape(image.shape[:2] + (channel_count,)), lut).reshape(image.shape)
+
+        # any other layout: index the tables with (channel, level)
+        channels = np.arange(channel_count).reshape(1, 1, channel_count)
+        return tables[channels, image.reshape(image.shape[:2] + (channel_count,))].reshape(image.shape)
+
+    @staticmethod
+    def apply_chain(image, operations):
+        # compose the chain on the histograms, then a single pass over the image
+        return PointOperations.apply(image, PointOperations.compose(image, operations))
@@ -0,0 +1,98 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class ThreadedExecution:
+    """
+    Opt-in thread pool for the per-channel loops and large row bands of the processing functions.
+    The heavy NumPy and FFT kernels release the GIL, so channels processed on threads run at the same time
+    inside one process without the start up and copying cost of worker processes.
+    Disabled by default: every helper then runs its work sequentially, exactly like a plain loop.
+    """
+
+    workers = None
+    _pool = None
+    _pool_pid = None
+    _local = threading.local()
+
+    # bands thinner than this are not worth a thread of their own
+    MIN_BAND_ROWS = 256
+
+    @classmethod
+    def enable(cls, workers=None):
+        cls.disable()
+        cls.workers = workers or os.cpu_count() or 1
+
+    @classmethod
+    def disable(cls):
+        if cls._pool is not None and cls._pool_pid == os.getpid():
+            cls._pool.shutdown()
+        cls.workers = None
+        cls._pool = None
+        cls._pool_pid = None
+
+    @classmethod
+    def is_enabled(cls):
+        return cls.workers is not None and cls.workers > 1
+
+    @classmethod
+    def nested_workers(cls):
+        # threads a single library call (e.g. a multithreaded fft) may start on its own: one while threading is
+        # disabled or when the call already runs on a pool thread
+        if not cls.is_enabled() or getattr(cls._local, 'inside_pool', False):
+            return 1
+        return cls.workers
+
+    @classmethod
+    def map(cls, function, items):
+        """Returns [function(item) for item in items], computed on the pool when threading is enabled."""
+        items = list(items)
+        # nested calls from inside a pool thread run inline, waiting on the same pool could deadlock it
+        if not cls.is_enabled() or len(items) < 2 or getattr(cls._local, 'inside_pool', False):
+            return [function(item) for item in items]
+
+        def run(item):
+            cls._local.inside_pool = True
+            try:
+                return function(item)
+            finally:
+                cls._local.inside_pool = False
+
+        return list(cls.__get_pool().map(run, items))
+
+    @classmethod
+    def map_channels(cls, function, image):
+        # apply a single channel function to every channel of an H×W×C image and stack the results back
+        channels = cls.map(lambda c: function(image[:, :, c]), range(image.shape[2]))
+        return np.stack(channels, axis=2)
+
+    @classmethod
+    def map_bands(cls, function, image, halo=0):
+        """
+        Applies function to horizontal bands of the image, each read with `halo` extra rows above and below
+        so that neighbourhood operations see the same context as on the whole image.
+        """
+        height = image.shape[0]
+        bands = min(cls.workers or 1, height // cls.MIN_BAND_ROWS)
+        if not cls.is_enabled() or bands < 2:
+            return function(image)
+
+        bounds = np.linspace(0, height, bands + 1).astype(int)
+
+        def run_band(band):
+            top, bottom = bounds[band], bounds[band + 1]
+            block_top, block_bottom = max(top - halo, 0), min(bottom + halo, height)
+            return function(image[block_top:block_bottom])[top - block_top:bottom - block_top]
+
+        return np.concatenate(cls.map(run_band, range(bands)), axis=0)
+
+    @classmethod
+    def __get_pool(cls):
+        # a pool inherited through fork has no live threads, start a fresh one in this process
+        if cls._pool is None or cls._pool_pid != os.getpid():
+            cls._pool = ThreadPoolExecutor(max_workers=cls.workers)
+            cls._pool_pid = os.getpid()
+        return cls._pool
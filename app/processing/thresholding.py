@@ -1,31 +1,147 @@
 import numpy as np
 import cv2
+from app.processing.binary_mask import BinaryMask
+from app.processing.convolution import Convolution
+from app.processing.histogram import Histogram
+from app.processing.integral_image import IntegralImage
+from app.processing.point_operations import PointOperations
 
 
 class Thresholding:
     @staticmethod
-    def global_threshold(image, threshold_value):
+    def global_threshold(image, threshold_value, packed=False):
+        # packed: a bit-packed BinaryMask instead of the 0/255 image
+        if packed:
+            return BinaryMask.from_bool(image > threshold_value)
+
+        # 8-bit images: a single table lookup
+        if image.dtype == np.uint8:
+            return PointOperations.apply(image, Thresholding.global_threshold_table(threshold_value))
+
         # Create an output binary image
         binary_image = np.zeros_like(image)
         binary_image[image > threshold_value] = 255
         return binary_image
 
     @staticmethod
-    def local_threshold(image, block_size):
-        # Pad the image to handle borders
-        padded_image = np.pad(image, pad_width=block_size // 2, mode='edge')  # pad_width to ensure that the local block is centered around each pixel
-        binary_image = np.zeros_like(image)
+    def global_threshold_table(threshold_value):
+        # 255 for the levels above the threshold, 0 for the others
+        return np.where(np.arange(256) > threshold_value, 255, 0).astype(np.uint8)
+
+    @staticmethod
+    def otsu_threshold(image, packed=False):
+        """
+        Global threshold chosen automatically with Otsu's method: the level that maximizes the between-class variance
+        of the pixels at or below it and the pixels above it. Returns (threshold, binary_image), the binary image
+        as a BinaryMask when packed.
+        """
+        if len(image.shape) != 2 or image.dtype != np.uint8:
+            raise ValueError("Input image must be an 8-bit grayscale image.")
+
+        threshold = Thresholding.__otsu_levels(Histogram.histogram(image), 2)[0]
+        return threshold, Thresholding.global_threshold(image, threshold, packed)
+
+    @staticmethod
+    def multi_otsu_threshold(image, classes=3):
+        """
+        Multi-level Otsu thresholding of a grayscale 8-bit image into 2 to 4 classes.
+        Returns the classes - 1 increasing thresholds and the label image (0 .. classes - 1): a pixel belongs to the
+        class of the number of thresholds it is above, like global_threshold puts pixels above the threshold at 255.
+        """
+        if len(image.shape) != 2 or image.dtype != np.uint8:
+            raise ValueError("Input image must be an 8-bit grayscale image.")
+        if not 2 <= classes <= 4:
+            raise ValueError("Multi-Otsu supports 2 to 4 classes.")
+
+        # the thresholds only depend on the (cached) histogram, not on the image size
+        thresholds = Thresholding.__otsu_levels(Histogram.histogram(image), classes)
+
+        # label of every level, applied to the image in one table lookup
+        label_table = np.searchsorted(np.asarray(thresholds), np.arange(256), side='left').astype(np.uint8)
+        return thresholds, PointOperations.apply(image, label_table)
+
+    def __otsu_levels(hist, classes):
+        # cumulative zeroth and first moments, with a leading zero: levels [a, b) weigh weights[b] - weights[a]
+        pdf = hist / max(np.sum(hist), 1)
+        weights = np.concatenate(([0.0], np.cumsum(pdf)))
+        moments = np.concatenate(([0.0], np.cumsum(pdf * np.arange(256))))
 
-        # Iterate over each pixel
-        for i in range(image.shape[0]):
-            for j in range(image.shape[1]):
-                # Extract the local block
-                local_block = padded_image[i:i + block_size, j:j + block_size]
-                # Calculate the local mean
-                local_mean = np.mean(local_block)
-                # Determine the threshold
-                threshold = local_mean
-                # Apply the threshold
-                binary_image[i, j] = 255 if image[i, j] > threshold else 0
+        # maximizing the between-class variance is maximizing the sum of weight·mean² of the classes;
+        # scores[a, b] is that term for the class of levels [a, b), empty ranges can not be chosen
+        weight = weights[None, :] - weights[:, None]
+        moment = moments[None, :] - moments[:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.where(weight > 0, moment * moment / weight, 0.0)
+        bounds = np.arange(257)
+        scores[bounds[:, None] >= bounds[None, :]] = -np.inf
 
+        # dynamic programming over the classes: best[b] is the best score of splitting the levels [0, b)
+        # into the classes so far, starts[k][b] where the last of them begins
+        best = scores[0]
+        starts = []
+        for _ in range(classes - 1):
+            candidates = best[:, None] + scores
+            starts.append(np.argmax(candidates, axis=0))
+            best = candidates[starts[-1], bounds]
+
+        # walk the class boundaries back from the end of the levels, the threshold is the last level of a lower class
+        thresholds = []
+        end = 256
+        for class_starts in reversed(starts):
+            end = class_starts[end]
+            thresholds.append(int(end) - 1)
+        return tuple(reversed(thresholds))
+
+    @staticmethod
+    def local_threshold(image, block_size, method='mean', k=None, r=128, packed=False):
+        """
+        Adaptive threshold against the statistics of the block_size×block_size neighbourhood of every pixel
+        (borders repeat the edge pixels): 255 where the pixel is above its local threshold, 0 elsewhere.
+            mean       threshold = m
+            niblack    threshold = m + k·s                 (k = -0.2 by default)
+            sauvola    threshold = m · (1 + k·(s / r - 1))  (k = 0.5, r = 128 by default)
+        with m and s the local mean and standard deviation. Both come from integral images of the pixels and their
+        squares, so the cost per pixel does not depend on the block size. Trailing axes are thresholded per channel.
+        With packed the result is a bit-packed BinaryMask instead of the 0/255 image.
+        """
+        # an empty (or single pixel) block never has a pixel above its mean
+        if block_size < 1:
+            return Thresholding.__binary_output(np.zeros(image.shape, dtype=bool), image, packed)
+
+        # sums over the block around every pixel, exact integers for integer images
+        block_shape = (block_size, block_size)
+        count = block_size * block_size
+        padded_image = Convolution.pad(image, block_shape, mode='edge')
+        sums = IntegralImage(padded_image).window_sum(block_shape)
+
+        if method == 'mean':
+            # integer images compare image·count > sum: the same decision as image > np.mean(block), without rounding
+            if np.issubdtype(sums.dtype, np.integer):
+                above = image.astype(np.int64) * count > sums
+            else:
+                above = image > sums / count
+            return Thresholding.__binary_output(above, image, packed)
+
+        if method not in ('niblack', 'sauvola'):
+            raise ValueError(f"Unknown local threshold method: {method}")
+
+        # local variance from the sums of the pixels and of their squares, exact up to the final division for integers
+        squares = padded_image.astype(np.int64 if np.issubdtype(sums.dtype, np.integer) else np.float64) ** 2
+        square_sums = IntegralImage(squares).window_sum(block_shape)
+        local_mean = sums / count
+        local_std = np.sqrt(np.maximum(count * square_sums - sums * sums, 0) / (count * count))
+
+        if method == 'niblack':
+            threshold = local_mean + (-0.2 if k is None else k) * local_std
+        else:
+            threshold = local_mean * (1 + (0.5 if k is None else k) * (local_std / r - 1))
+
+        return Thresholding.__binary_output(image > threshold, image, packed)
+
+    def __binary_output(above, image, packed):
+        # 255 for the pixels above their threshold in an image of the input type, or the packed mask
+        if packed:
+            return BinaryMask.from_bool(above)
+        binary_image = np.zeros_like(image)
+        binary_image[above] = 255
         return binary_image
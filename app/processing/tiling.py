@@ -0,0 +1,90 @@
+import numpy as np
+from app.processing.denoise import Denoise
+from app.processing.edge_detection import EdgeDetection
+from app.processing.thresholding import Thresholding
+
+
+class TiledProcessor:
+    """
+    Runs a neighbourhood operation tile by tile so that peak memory depends on the tile size and not on the image size.
+    Every tile is read together with a halo as wide as the operation's radius, the operation runs on that block
+    and only the tile's own pixels are written to the output, which can be preallocated or memory-mapped (.npy).
+    As long as the halo covers the radius the result is identical to running the operation on the whole image:
+    tiles on the image border still see the border, so the operation pads them exactly like the full image.
+    """
+
+    # radius (pixels of context needed on every side) of the neighbourhood operations of app.processing
+    RADIUS = {
+        Denoise.apply_average_filter: lambda kernel_size=3: kernel_size // 2,
+        Denoise.apply_gaussian_filter: lambda kernel_size=3, sigma=1: kernel_size // 2,
+        Denoise.apply_median_filter: lambda kernel_size=3: kernel_size // 2,
+        EdgeDetection.apply_sobel: lambda: 1,
+        EdgeDetection.apply_roberts: lambda: 1,
+        EdgeDetection.apply_prewitt: lambda: 1,
+        Thresholding.local_threshold: lambda block_size, method='mean', k=None, r=128: block_size // 2,
+    }
+
+    @staticmethod
+    def radius(operation, **kwargs):
+        # context an operation needs around every pixel for the given parameters
+        if operation not in TiledProcessor.RADIUS:
+            raise ValueError(f"Unknown neighbourhood operation {operation}, pass the halo explicitly.")
+        return TiledProcessor.RADIUS[operation](**kwargs)
+
+    @staticmethod
+    def tiles(image_shape, tile_size=512, halo=0):
+        """
+        Yields (tile, block, inner) slice pairs covering the image:
+        tile is the region written to the output, block the region read from the input (tile plus halo,
+        cut at the image border) and inner the position of the tile inside the block.
+        """
+        height, width = image_shape[:2]
+        tile_height, tile_width = (tile_size, tile_size) if np.isscalar(tile_size) else tile_size
+
+        for top in range(0, height, tile_height):
+            bottom = min(top + tile_height, height)
+            block_top, block_bottom = max(top - halo, 0), min(bottom + halo, height)
+
+            for left in range(0, width, tile_width):
+                right = min(left + tile_width, width)
+                block_left, block_right = max(left - halo, 0), min(right + halo, width)
+
+                tile = (slice(top, bottom), slice(left, right))
+                block = (slice(block_top, block_bottom), slice(block_left, block_right))
+                inner = (slice(top - block_top, bottom - block_top), slice(left - block_left, right - block_left))
+                yield tile, block, inner
+
+    @staticmethod
+    def create_output(shape, dtype, out=None):
+        """Returns the output array: a preallocated array, a new memory-mapped .npy file when out is a path, or a new array."""
+        if out is None:
+            return np.empty(shape, dtype=dtype)
+        if isinstance(out, str):
+            return np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+        if out.shape != tuple(shape):
+            raise ValueError(f"Output shape {out.shape} does not match the expected shape {tuple(shape)}.")
+        return out
+
+    @staticmethod
+    def apply(image, operation, tile_size=512, halo=None, out=None, tile_arguments=None, **kwargs):
+        """
+        Applies operation(block, **kwargs) tile by tile and returns the assembled output.
+        tile_arguments optionally holds one dict of extra keyword arguments per tile, in the order of tiles().
+        The input may itself be memory-mapped (np.load(path, mmap_mode='r')), only one block is in memory at a time.
+        """
+        if halo is None:
+            halo = TiledProcessor.radius(operation, **kwargs)
+
+        output = None
+        for index, (tile, block, inner) in enumerate(TiledProcessor.tiles(image.shape, tile_size, halo)):
+            arguments = kwargs if tile_arguments is None else {**kwargs, **tile_arguments[index]}
+            result = operation(np.ascontiguousarray(image[block]), **arguments)
+
+            # the output type and channel layout are only known once the first tile has been processed
+            if output is None:
+                output = TiledProcessor.create_output(image.shape[:2] + result.shape[2:], result.dtype, out)
+            output[tile] = result[inner]
+
+        if isinstance(output, np.memmap):
+            output.flush()
+        return output